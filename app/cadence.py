@@ -0,0 +1,67 @@
+# ===============================
+#  Release cadence and adaptive check planning
+# ===============================
+import statistics
+
+MERGE_GAP = 12 * 3600         # downloads this close together count as one release (backfills, batches)
+MIN_PERIOD = 86400            # sub-daily "cadences" are noise, not a schedule
+MAX_GAPS = 8                  # only the most recent gaps describe the current season
+WINDOW = 3 * 3600             # dense polling from this long before to this long after the expected slot
+DORMANT_AFTER = 21 * 86400    # no release for this long (or 3 periods): back off
+
+
+def release_times(first_seen):
+    """First-download epochs per episode -> sorted release events, near-duplicates merged."""
+    events = []
+    for at in sorted(t for t in first_seen if t):
+        if not events or at - events[-1] >= MERGE_GAP:
+            events.append(at)
+    return events
+
+
+def estimate_period(events):
+    """Median gap between the latest releases in seconds, or None without a
+    steady cadence (fewer than two gaps, sub-daily, or mostly irregular)."""
+    gaps = [b - a for a, b in zip(events, events[1:])][-MAX_GAPS:]
+    if len(gaps) < 2:
+        return None
+    period = statistics.median(gaps)
+    if period < MIN_PERIOD:
+        return None
+    steady = sum(1 for gap in gaps if abs(gap - period) <= period / 4)
+    return period if steady * 2 >= len(gaps) else None
+
+
+def plan_check(now, events, interval, dense, sparse):
+    """Seconds until a show should be checked again, and its expected next
+    release (epoch) or None.
+
+    With a steady cadence the show is checked every `dense` seconds (never
+    slower than its own interval) within WINDOW of the expected slot, and in
+    between only once per `sparse` seconds or when the window opens. A missed
+    slot rolls forward by one period. Without new releases for DORMANT_AFTER
+    or three periods the wait grows with the silence, which doubles it from
+    one check to the next, up to `sparse`.
+    """
+    dense = min(interval, dense)
+    sparse = max(interval, sparse)
+    if not events:
+        return interval, None
+    last = events[-1]
+    period = estimate_period(events)
+    quiet_after = max(DORMANT_AFTER, 3 * period) if period else DORMANT_AFTER
+    silence = now - last - quiet_after
+    if silence > 0:
+        return min(max(interval, silence), sparse), None
+    if period is None:
+        return interval, None
+
+    expected = last + period
+    overdue = now - (expected + WINDOW)
+    while expected + WINDOW < now:
+        expected += period
+    opens = expected - WINDOW
+    if now >= opens:
+        return dense, expected
+    wait = max(interval, overdue) if overdue > 0 else sparse
+    return min(opens - now, wait, sparse), expected
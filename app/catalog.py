@@ -0,0 +1,74 @@
+# ===============================
+#  Local search catalog (FTS5)
+# ===============================
+import time
+
+from coalesce import coalescable, query_terms
+from records import Release
+
+UPSERT_SQL = (
+    "INSERT INTO catalog (infohash, torrent_id, title, magnet, size_bytes, published_at, seeders, episode, is_movie, seen_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (infohash) DO UPDATE SET "
+    "torrent_id = COALESCE(excluded.torrent_id, catalog.torrent_id), title = excluded.title, "
+    "magnet = excluded.magnet, size_bytes = excluded.size_bytes, published_at = excluded.published_at, "
+    "seeders = excluded.seeders, "
+    "episode = excluded.episode, is_movie = excluded.is_movie, seen_at = excluded.seen_at"
+)
+
+
+def match_expression(query):
+    """FTS5 MATCH expression for a plain nyaa query, or None when the query
+    uses syntax (| ( ) * ...) the catalog cannot answer for."""
+    if not coalescable(query):
+        return None
+    required, excluded = query_terms(query)
+    expression = ' AND '.join(f'"{token}"' for token in sorted(required))
+    return expression + ''.join(f' NOT "{token}"' for token in sorted(excluded))
+
+
+def record_page(cursor, search_query, page, results, total_pages, torrent_ids, now=None):
+    """Upsert one listing page's parsed rows and remember when it was fetched.
+
+    torrent_ids are the ids of every row on the page (parsed or not); their
+    range is what page() later serves for this (query, page). Returns the
+    number of rows written.
+    """
+    now = int(now if now is not None else time.time())
+    rows = [(r.infohash, r.torrent_id, r.title, r.magnet, r.size, r.timestamp,
+             r.seeders, r.episode, int(bool(r.is_movie)), now)
+            for r in results if r.infohash]
+    cursor.executemany(UPSERT_SQL, rows)
+    ids = [i for i in torrent_ids if i is not None]
+    cursor.execute(
+        "INSERT OR REPLACE INTO catalog_pages (search_query, page, fetched_at, total_pages, max_torrent_id, min_torrent_id) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (search_query, page, now, total_pages, max(ids, default=None), min(ids, default=None))
+    )
+    return len(rows)
+
+
+def page_state(cursor, search_query, page):
+    """catalog_pages row of (search_query, page), or None if never fetched."""
+    cursor.execute("SELECT * FROM catalog_pages WHERE search_query = ? AND page = ?", (search_query, page))
+    return cursor.fetchone()
+
+
+def page(cursor, search_query, state):
+    """Release records (as fetch_magnet_links builds them) for the page described
+    by state: catalog rows matching the query within the page's id range,
+    newest first."""
+    expression = match_expression(search_query)
+    if expression is None or state['max_torrent_id'] is None:
+        return []
+    cursor.execute(
+        "SELECT c.* FROM catalog_fts JOIN catalog c ON c.id = catalog_fts.rowid "
+        "WHERE catalog_fts MATCH ? AND c.torrent_id BETWEEN ? AND ? "
+        "ORDER BY c.torrent_id DESC",
+        (expression, state['min_torrent_id'], state['max_torrent_id'])
+    )
+    return [
+        Release(row['title'], row['episode'], row['magnet'], row['infohash'], row['size_bytes'],
+                row['published_at'], row['seeders'], bool(row['is_movie']), row['torrent_id'])
+        for row in cursor.fetchall()
+    ]
@@ -0,0 +1,79 @@
+# ===============================
+#  Query coalescing for sweeps
+# ===============================
+import re
+from collections import Counter
+
+_TOKEN = re.compile(r'[^\W_]+')
+_UNSAFE = set('|()*+~')  # search syntax we cannot replay locally
+
+MAX_QUERY_LENGTH = 400  # characters per combined query; nyaa takes it as a GET parameter
+
+
+def tokenize(text):
+    return _TOKEN.findall((text or '').lower())
+
+
+def coalescable(query):
+    """Whether query can be OR-ed with others and matched locally: plain words,
+    "phrases" and -exclusions only."""
+    return not (_UNSAFE & set(query)) and bool(query_terms(query)[0])
+
+
+def query_terms(query):
+    """(required tokens, excluded tokens) of a plain nyaa search query."""
+    required, excluded = set(), set()
+    for term in query.replace('"', ' ').split():
+        if term.startswith('-') and len(term) > 1:
+            excluded.update(tokenize(term[1:]))
+        else:
+            required.update(tokenize(term))
+    return frozenset(required), frozenset(excluded)
+
+
+def group_queries(queries, max_group=8, max_length=MAX_QUERY_LENGTH):
+    """Pack queries into nyaa OR-queries '(a b)|(c d)'.
+
+    Returns [(combined_query, [member queries])], at most max_group members
+    and roughly max_length characters per combined query.
+    """
+    groups = []
+    members, length = [], 0
+    for query in dict.fromkeys(q.strip() for q in queries if q and q.strip()):
+        part = len(query) + 3
+        if members and (len(members) >= max_group or length + part > max_length):
+            groups.append(members)
+            members, length = [], 0
+        members.append(query)
+        length += part
+    if members:
+        groups.append(members)
+    return [('|'.join(f"({q})" for q in group) if len(group) > 1 else group[0], group) for group in groups]
+
+
+class QueryMatcher:
+    """Route release titles to the search queries that would have found them.
+
+    A title matches a query when it contains every required token and none
+    of the excluded ones (nyaa's AND semantics). Each query is indexed under
+    its rarest token, so matching a title costs one dict lookup per title
+    token plus a subset check per candidate, however long the watchlist is.
+    """
+
+    def __init__(self, queries):
+        self.terms = {q: query_terms(q) for q in queries if coalescable(q)}
+        frequency = Counter(token for required, _ in self.terms.values() for token in required)
+        self.index = {}
+        for query, (required, _) in self.terms.items():
+            anchor = min(required, key=lambda token: (frequency[token], -len(token), token))
+            self.index.setdefault(anchor, []).append(query)
+
+    def match(self, title):
+        tokens = set(tokenize(title))
+        found = []
+        for token in tokens:
+            for query in self.index.get(token, ()):
+                required, excluded = self.terms[query]
+                if required <= tokens and not (excluded & tokens):
+                    found.append(query)
+        return found
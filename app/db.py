@@ -0,0 +1,357 @@
+# ===============================
+#  SQLite access layer
+# ===============================
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import metrics
+from magnet import extract_infohash
+from records import parse_listing_date, parse_size
+
+DB_PATH = os.environ.get('DB_PATH', 'data/anime_watchlist.db')
+DB_BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 15000))
+
+_local = threading.local()
+
+SQLITE_SECONDS = metrics.histogram('sqlite_query_seconds', 'SQLite statement time by kind', metrics.FAST_BUCKETS)
+
+
+def _kind(sql):
+    word = sql.lstrip().split(None, 1)[0].lower() if sql.strip() else ''
+    return word if word in ('select', 'insert', 'update', 'delete', 'begin', 'pragma') else 'other'
+
+
+class _TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        with SQLITE_SECONDS.time(kind=_kind(sql)):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        with SQLITE_SECONDS.time(kind=_kind(sql)):
+            return super().executemany(sql, seq_of_parameters)
+
+
+class _TimedConnection(sqlite3.Connection):
+    """Connection whose statements (through it or its cursors) and commits
+    land in sqlite_query_seconds."""
+
+    def cursor(self, factory=_TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        with SQLITE_SECONDS.time(kind='commit'):
+            return super().commit()
+
+
+def _connect():
+    os.makedirs(os.path.dirname(DB_PATH) or '.', exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT_MS / 1000, factory=_TimedConnection)
+    conn.row_factory = sqlite3.Row
+    # WAL lets readers (every page view) run while the scheduler writes
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    return conn
+
+
+def get_db():
+    """The current thread's connection, opened on first use and then reused.
+
+    Rows come back as sqlite3.Row. Callers commit their own writes and must
+    not close the connection; release_db() cleans up after a failed request.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = _local.conn = _connect()
+    return conn
+
+
+def known_infohashes(cursor, infohashes):
+    """Subset of infohashes already recorded in downloads (one query per 500)."""
+    wanted = list({h for h in infohashes if h})
+    known = set()
+    for i in range(0, len(wanted), 500):
+        chunk = wanted[i:i + 500]
+        cursor.execute(
+            f"SELECT infohash FROM downloads WHERE infohash IN ({','.join('?' * len(chunk))})", chunk
+        )
+        known.update(row[0] for row in cursor.fetchall())
+    return known
+
+
+def release_db():
+    """Roll back anything a failed unit of work left open on this thread."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+
+def close_db():
+    """Close this thread's connection; the next get_db() opens a new one.
+
+    Needed before fork (gunicorn's master runs init_db), as a child must
+    not reuse the parent's connection.
+    """
+    conn = getattr(_local, 'conn', None)
+    _local.conn = None
+    if conn is not None:
+        conn.close()
+
+
+# ===============================
+#  Migrations (PRAGMA user_version)
+# ===============================
+def _m1_base_schema(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS anime (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            search_query TEXT NOT NULL,
+            status TEXT DEFAULT 'watching',
+            last_episode INTEGER DEFAULT 0,
+            next_episode_date TEXT,
+            auto_download BOOLEAN DEFAULT 1,
+            schedule_interval TEXT DEFAULT 'global'
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS downloads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            anime_id INTEGER,
+            episode INTEGER,
+            magnet_link TEXT,
+            download_date TEXT,
+            FOREIGN KEY (anime_id) REFERENCES anime (id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            anime_id INTEGER,
+            task_type TEXT,
+            status TEXT DEFAULT 'running',
+            progress INTEGER DEFAULT 0,
+            total_pages INTEGER DEFAULT 1,
+            current_page INTEGER DEFAULT 1,
+            created_at TEXT,
+            updated_at TEXT,
+            FOREIGN KEY (anime_id) REFERENCES anime (id)
+        )
+    ''')
+
+
+def _m2_access_indexes(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_downloads_anime_episode ON downloads (anime_id, episode)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_downloads_date ON downloads (download_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_anime ON tasks (anime_id, id)")
+
+
+def _m3_infohash_ledger(cursor):
+    cursor.execute("ALTER TABLE downloads ADD COLUMN infohash TEXT")
+    rows = cursor.execute("SELECT id, magnet_link FROM downloads").fetchall()
+    cursor.executemany(
+        "UPDATE downloads SET infohash = ? WHERE id = ?",
+        [(extract_infohash(magnet), row_id) for row_id, magnet in rows]
+    )
+    # keep the first download of every torrent, drop the re-sends
+    cursor.execute('''
+        DELETE FROM downloads
+        WHERE infohash IS NOT NULL
+          AND id NOT IN (SELECT MIN(id) FROM downloads WHERE infohash IS NOT NULL GROUP BY infohash)
+    ''')
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_downloads_infohash ON downloads (infohash)")
+
+
+def _m4_schedule_change_feed(cursor):
+    # updated_seq grows whenever scheduling-relevant columns change, so the
+    # scheduler can read just the changed rows instead of the whole table
+    cursor.execute("ALTER TABLE anime ADD COLUMN updated_seq INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("UPDATE anime SET updated_seq = id")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_anime_updated_seq ON anime (updated_seq)")
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS anime_seq_insert AFTER INSERT ON anime
+        BEGIN
+            UPDATE anime SET updated_seq = (SELECT MAX(updated_seq) FROM anime) + 1 WHERE id = NEW.id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS anime_seq_update
+        AFTER UPDATE OF schedule_interval, status, auto_download ON anime
+        BEGIN
+            UPDATE anime SET updated_seq = (SELECT MAX(updated_seq) FROM anime) + 1 WHERE id = NEW.id;
+        END
+    ''')
+
+
+def _m5_high_water_marks(cursor):
+    # newest nyaa torrent id already processed per show; scans stop paging there
+    cursor.execute("ALTER TABLE anime ADD COLUMN last_seen_torrent_id INTEGER NOT NULL DEFAULT 0")
+
+
+def _m6_job_queue(cursor):
+    # tasks doubles as a durable job queue: priority order, a lease that the
+    # running worker keeps extending, and the handler's arguments as JSON
+    cursor.execute("ALTER TABLE tasks ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("ALTER TABLE tasks ADD COLUMN payload TEXT")
+    cursor.execute("ALTER TABLE tasks ADD COLUMN lease_owner TEXT")
+    cursor.execute("ALTER TABLE tasks ADD COLUMN lease_until REAL")
+    cursor.execute("ALTER TABLE tasks ADD COLUMN heartbeat_at REAL")
+    cursor.execute("ALTER TABLE tasks ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_queue ON tasks (status, priority DESC, id)")
+
+
+def _epoch(text):
+    try:
+        return int(datetime.strptime(text, "%Y-%m-%d %H:%M:%S").timestamp())
+    except (TypeError, ValueError):
+        return 0
+
+
+def _m7_download_timestamps(cursor):
+    # history is paged by (downloaded_at, id); the TEXT date stays for display
+    cursor.execute("ALTER TABLE downloads ADD COLUMN downloaded_at INTEGER NOT NULL DEFAULT 0")
+    rows = cursor.execute("SELECT id, download_date FROM downloads").fetchall()
+    cursor.executemany(
+        "UPDATE downloads SET downloaded_at = ? WHERE id = ?",
+        [(_epoch(download_date), row_id) for row_id, download_date in rows]
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_downloads_recent ON downloads (downloaded_at DESC, id DESC)")
+    cursor.execute("DROP INDEX IF EXISTS idx_downloads_date")
+
+
+def _m8_search_catalog(cursor):
+    # every parsed listing row, full-text searchable; catalog_pages records
+    # when each (query, page) was last fetched and which torrent ids it spanned
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS catalog (
+            id INTEGER PRIMARY KEY,
+            infohash TEXT NOT NULL UNIQUE,
+            torrent_id INTEGER,
+            title TEXT NOT NULL,
+            magnet TEXT NOT NULL,
+            size TEXT,
+            date TEXT,
+            seeders INTEGER,
+            episode INTEGER,
+            is_movie INTEGER NOT NULL DEFAULT 0,
+            seen_at INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_catalog_torrent_id ON catalog (torrent_id)")
+    cursor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS catalog_fts USING fts5("
+        "title, content='catalog', content_rowid='id', tokenize='unicode61 remove_diacritics 0')"
+    )
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS catalog_fts_insert AFTER INSERT ON catalog BEGIN
+            INSERT INTO catalog_fts (rowid, title) VALUES (new.id, new.title);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS catalog_fts_delete AFTER DELETE ON catalog BEGIN
+            INSERT INTO catalog_fts (catalog_fts, rowid, title) VALUES ('delete', old.id, old.title);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS catalog_fts_update AFTER UPDATE OF title ON catalog
+        WHEN old.title IS NOT new.title BEGIN
+            INSERT INTO catalog_fts (catalog_fts, rowid, title) VALUES ('delete', old.id, old.title);
+            INSERT INTO catalog_fts (rowid, title) VALUES (new.id, new.title);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_pages (
+            search_query TEXT NOT NULL,
+            page INTEGER NOT NULL,
+            fetched_at INTEGER NOT NULL,
+            total_pages INTEGER NOT NULL DEFAULT 1,
+            max_torrent_id INTEGER,
+            min_torrent_id INTEGER,
+            PRIMARY KEY (search_query, page)
+        )
+    ''')
+
+
+def _m9_torrent_state(cursor):
+    # qBittorrent's view of each torrent, kept current by torrent_sync; joined to downloads by infohash
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS torrent_state (
+            infohash TEXT PRIMARY KEY,
+            name TEXT,
+            state TEXT,
+            progress REAL,
+            size INTEGER,
+            dlspeed INTEGER,
+            eta INTEGER,
+            added_on INTEGER,
+            completion_on INTEGER,
+            updated_at INTEGER NOT NULL
+        )
+    ''')
+
+
+def _m10_leases(cursor):
+    # one row per singleton role (the scheduler); its holder renews expires_at
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            heartbeat_at REAL NOT NULL
+        )
+    ''')
+
+
+def _m11_catalog_numbers(cursor):
+    # sizes in bytes and upload times in epoch seconds, parsed once when a row is scraped
+    cursor.execute("ALTER TABLE catalog ADD COLUMN size_bytes INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("ALTER TABLE catalog ADD COLUMN published_at INTEGER NOT NULL DEFAULT 0")
+    rows = cursor.execute("SELECT id, size, date FROM catalog").fetchall()
+    cursor.executemany(
+        "UPDATE catalog SET size_bytes = ?, published_at = ? WHERE id = ?",
+        [(parse_size(size), parse_listing_date(date), row_id) for row_id, size, date in rows]
+    )
+
+
+# Append only; a migration's position is its schema version.
+MIGRATIONS = [
+    _m1_base_schema,
+    _m2_access_indexes,
+    _m3_infohash_ledger,
+    _m4_schedule_change_feed,
+    _m5_high_water_marks,
+    _m6_job_queue,
+    _m7_download_timestamps,
+    _m8_search_catalog,
+    _m9_torrent_state,
+    _m10_leases,
+    _m11_catalog_numbers,
+]
+
+
+def init_db():
+    """Bring the schema up to the latest version. Safe to call from several processes."""
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")  # serialise concurrent init_db callers
+    try:
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        for target, migrate in enumerate(MIGRATIONS, 1):
+            if target > version:
+                migrate(cursor)
+                cursor.execute(f"PRAGMA user_version = {target}")
+                print(f"[DB] migrated to schema version {target}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
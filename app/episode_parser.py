@@ -0,0 +1,89 @@
+# ===============================
+#  Episode / season parser
+# ===============================
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+Release = namedtuple('Release', ['episode', 'season', 'is_movie'])
+
+BATCH_MARKERS = ('batch', 'complete', '01-', '-complete')
+
+# Ranked episode markers in one alternation, highest priority first. Every
+# branch starts with the literal space that precedes a token (titles are
+# padded and '.'/'_' become spaces), so re can skip ahead to candidate
+# positions, and one finditer() pass picks the best-ranked match.
+_EPISODE = re.compile(
+    r' (?:s\s*(?P<s0>\d{2})\s*e\s*(?P<e0>\d{2})(?=\W|$)'
+    r'|s?0*(?P<s1>\d{1,2})e0*(?P<e1>\d{1,3})(?=\W|$)'
+    r'|(?:ep|episode|e)\s*(?P<e2>\d{1,4})'
+    r'|- (?P<e3>\d{1,4})(?:v\d)?(?=\s|$)'
+    r'|\[(?P<e4>\d{1,4})(?:v\d)?\](?=\s|$)'
+    r'|e(?P<e5>\d+)(?=\s|$)'
+    r'|(?:s|season\s*)(?P<s6>\d{1,2})(?!\d))'
+)
+_RANK = {'e0': 0, 'e1': 1, 'e2': 2, 'e3': 3, 'e4': 4, 'e5': 5}
+_SEASON_OF = {'e0': 's0', 'e1': 's1'}
+
+# Numbers that are never the episode: CRC tags, resolutions, codecs, bit
+# depth, audio channels and bracketed years. Only needed before the bare
+# number fallback, which is what used to pick up "1080p" or "AAC 2.0".
+_NOISE = re.compile(
+    r'\[\w{8}\]'
+    r'|(?<![a-z\d])\d{3,4}[pi](?![a-z\d])'
+    r'|\d{3,4}x\d{3,4}'
+    r'|[xh] ?26[45]'
+    r'|(?:ma|hi)10p|hi444pp?'
+    r'|\d{1,2}\s?-?bits?'
+    r'|(?:aac|ac3|eac3|ddp?|flac|opus|dts)\s?\d \d|\b[257] [01]\b'
+    r'|[\[(](?:19|20)\d{2}[\])]'
+)
+_FALLBACK = re.compile(r' (?:s|season\s*)(?P<season>\d{1,2})(?!\d)|(?<![\dv])(?P<episode>\d{1,2})(?!\d)')
+
+
+@lru_cache(maxsize=8192)
+def parse_release(title):
+    """Parse a release title into Release(episode, season, is_movie).
+
+    Returns None for batch releases. episode is -1 when no number was
+    found (0 for movies), season is None unless the title names one.
+    Results are memoised per title, so rescanning a listing is free.
+    """
+    title_lower = title.lower()
+    if any(marker in title_lower for marker in BATCH_MARKERS):
+        return None
+
+    is_movie = 'movie' in title_lower or 'film' in title_lower
+    text = ' ' + title_lower.replace('.', ' ').replace('_', ' ')
+
+    best_rank, episode, season, season_hint = len(_RANK), -1, None, None
+    for match in _EPISODE.finditer(text):
+        name = match.lastgroup
+        if name == 's6':
+            if season_hint is None:
+                season_hint = int(match.group(name))
+            continue
+        rank = _RANK[name]
+        if rank >= best_rank:
+            continue
+        ep = int(match.group(name))
+        if ep >= 5000:
+            continue
+        best_rank, episode = rank, ep
+        season = int(match.group(_SEASON_OF[name])) if name in _SEASON_OF else None
+        if rank == 0:
+            break
+
+    if episode == -1:
+        for match in _FALLBACK.finditer(_NOISE.sub(' ', text)):
+            if match.lastgroup == 'episode':
+                episode = int(match.group('episode'))
+                break
+            if season_hint is None:
+                season_hint = int(match.group('season'))
+
+    if season is None:
+        season = season_hint
+    if is_movie and episode == -1:
+        episode = 0
+    return Release(episode, season, is_movie)
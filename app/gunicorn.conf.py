@@ -0,0 +1,21 @@
+# ===============================
+#  Gunicorn hooks
+# ===============================
+# Schema setup runs once in the master before any worker forks; each worker
+# then joins the scheduler leader election (see leader.py) once loaded.
+
+
+def on_starting(server):
+    from db import close_db, init_db
+    init_db()
+    close_db()  # workers open their own connections
+
+
+def post_worker_init(worker):
+    import app
+    app.start_background()
+
+
+def worker_exit(server, worker):
+    import app
+    app.leader.release()  # let a surviving worker take over now rather than after the lease runs out
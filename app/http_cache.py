@@ -0,0 +1,94 @@
+# ===============================
+#  Shared HTTP response cache
+# ===============================
+import os
+import sqlite3
+import threading
+import time
+
+
+class ResponseCache:
+    """GET response cache in a SQLite file, shared by every gunicorn worker.
+
+    Entries younger than `ttl` seconds are served without a request. Older
+    ones are revalidated with If-None-Match / If-Modified-Since, so an
+    unchanged page costs a 304 instead of a full body. The store keeps at
+    most `max_entries` rows and evicts the least recently used first.
+    """
+
+    TOUCH_INTERVAL = 30  # don't rewrite last_access on every hit
+
+    def __init__(self, path, ttl=120, max_entries=512):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialised = False
+
+    def _db(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if not self._initialised:
+                    conn.execute('''
+                        CREATE TABLE IF NOT EXISTS responses (
+                            url TEXT PRIMARY KEY,
+                            body BLOB NOT NULL,
+                            etag TEXT,
+                            last_modified TEXT,
+                            fetched_at REAL NOT NULL,
+                            last_access REAL NOT NULL
+                        )
+                    ''')
+                    conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)")
+                    self._initialised = True
+            self._local.conn = conn
+        return conn
+
+    def fetch(self, url, get):
+        """Return the body of `url` as bytes.
+
+        `get(url, headers)` performs the real request and returns a
+        requests.Response; HTTP errors are raised via raise_for_status().
+        """
+        db = self._db()
+        now = time.time()
+        row = db.execute(
+            "SELECT body, etag, last_modified, fetched_at, last_access FROM responses WHERE url = ?", (url,)
+        ).fetchone()
+
+        if row and now - row[3] < self.ttl:
+            if now - row[4] > self.TOUCH_INTERVAL:
+                db.execute("UPDATE responses SET last_access = ? WHERE url = ?", (now, url))
+            return row[0]
+
+        headers = {}
+        if row:
+            if row[1]:
+                headers['If-None-Match'] = row[1]
+            if row[2]:
+                headers['If-Modified-Since'] = row[2]
+
+        resp = get(url, headers)
+        if resp.status_code == 304 and row:
+            db.execute("UPDATE responses SET fetched_at = ?, last_access = ? WHERE url = ?", (now, now, url))
+            return row[0]
+        resp.raise_for_status()
+
+        body = resp.content
+        db.execute(
+            "INSERT OR REPLACE INTO responses (url, body, etag, last_modified, fetched_at, last_access) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (url, body, resp.headers.get('ETag'), resp.headers.get('Last-Modified'), now, now)
+        )
+        db.execute(
+            "DELETE FROM responses WHERE url IN "
+            "(SELECT url FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        return body
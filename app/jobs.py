@@ -0,0 +1,154 @@
+# ===============================
+#  Durable job queue (tasks table)
+# ===============================
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+
+from db import get_db, release_db
+
+PRIORITY_MANUAL = 10  # user-started scans run before scheduled sweeps
+PRIORITY_SWEEP = 0
+
+
+def now_str():
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def task_payload(task):
+    try:
+        return json.loads(task['payload'] or '{}')
+    except (TypeError, ValueError):
+        return {}
+
+
+def enqueue(cursor, anime_id, task_type, payload=None, priority=0, total_pages=1):
+    """Insert a queued task; the caller commits. Returns the task id."""
+    cursor.execute(
+        "INSERT INTO tasks (anime_id, task_type, status, total_pages, current_page, priority, payload, created_at, updated_at) "
+        "VALUES (?, ?, 'queued', ?, 0, ?, ?, ?, ?)",
+        (anime_id, task_type, total_pages, priority, json.dumps(payload or {}), now_str(), now_str())
+    )
+    return cursor.lastrowid
+
+
+class JobQueue:
+    """Fixed pool of worker threads draining the tasks table.
+
+    A worker claims the highest-priority queued task, or a running one
+    whose lease expired (its worker died), under BEGIN IMMEDIATE so two
+    processes never claim the same row. While a handler runs, the lease is
+    extended every lease_seconds / 3. handlers[task_type](task) gets the
+    claimed row and resumes from task['current_page'] if that is set; it
+    records its own final status. Exceptions requeue the task until
+    max_attempts, then mark it failed through on_failed(task).
+    """
+
+    def __init__(self, handlers, on_failed, workers=2, lease_seconds=60, poll_interval=2, max_attempts=3):
+        self.handlers = handlers
+        self.on_failed = on_failed
+        self.workers = max(1, workers)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def wake(self):
+        """Let idle workers in this process look for new work right away."""
+        self._wakeup.set()
+
+    def start(self):
+        self._stop = stop = threading.Event()  # a fresh event, so workers of an earlier start stay stopped
+        self._threads = [t for t in self._threads if t.is_alive()]
+        for n in range(self.workers):
+            t = threading.Thread(target=self._work, args=(stop,), name=f"job-worker-{n}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        print(f"[Jobs] {self.workers} workers started in PID {os.getpid()}")
+
+    def stop(self):
+        """Let the workers exit once their current task is done."""
+        self._stop.set()
+        self._wakeup.set()
+
+    def claim(self):
+        conn = get_db()
+        cursor = conn.cursor()
+        now = time.time()
+        placeholders = ','.join('?' * len(self.handlers))
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute(
+                f"SELECT * FROM tasks WHERE task_type IN ({placeholders}) AND "
+                "(status = 'queued' OR (status = 'running' AND (lease_until IS NULL OR lease_until < ?))) "
+                "ORDER BY priority DESC, id LIMIT 1",
+                (*self.handlers, now)
+            )
+            task = cursor.fetchone()
+            if task is not None:
+                cursor.execute(
+                    "UPDATE tasks SET status = 'running', lease_owner = ?, lease_until = ?, heartbeat_at = ?, "
+                    "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (self.owner, now + self.lease_seconds, now, now_str(), task['id'])
+                )
+                task = cursor.execute("SELECT * FROM tasks WHERE id = ?", (task['id'],)).fetchone()
+            conn.commit()
+            return task
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _heartbeat(self, task_id, done):
+        conn = get_db()
+        while not done.wait(self.lease_seconds / 3):
+            try:
+                now = time.time()
+                conn.execute(
+                    "UPDATE tasks SET heartbeat_at = ?, lease_until = ? WHERE id = ? AND status = 'running' AND lease_owner = ?",
+                    (now, now + self.lease_seconds, task_id, self.owner)
+                )
+                conn.commit()
+            except Exception as e:
+                print(f"[Jobs] heartbeat for task {task_id} failed: {e}")
+                release_db()
+
+    def _run(self, task):
+        done = threading.Event()
+        beat = threading.Thread(target=self._heartbeat, args=(task['id'], done), daemon=True)
+        beat.start()
+        try:
+            self.handlers[task['task_type']](task)
+        except Exception as e:
+            print(f"[Jobs] task {task['id']} ({task['task_type']}) failed: {e}")
+            traceback.print_exc()
+            release_db()
+            if task['attempts'] >= self.max_attempts:
+                self.on_failed(task)
+            else:
+                conn = get_db()
+                conn.execute(
+                    "UPDATE tasks SET status = 'queued', lease_owner = NULL, lease_until = NULL, updated_at = ? WHERE id = ?",
+                    (now_str(), task['id'])
+                )
+                conn.commit()
+        finally:
+            done.set()
+
+    def _work(self, stop):
+        while not stop.is_set():
+            try:
+                task = self.claim()
+            except Exception as e:
+                print(f"[Jobs] claim failed: {e}")
+                task = None
+            if task is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run(task)
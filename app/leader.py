@@ -0,0 +1,92 @@
+# ===============================
+#  Leader lease (leases table)
+# ===============================
+import os
+import socket
+import threading
+import time
+
+from db import get_db, release_db
+
+
+class LeaderLease:
+    """Elects one process to run the background services, through a row in leases.
+
+    Every process polls every ttl / 3 seconds. The holder pushes expires_at
+    forward; anyone else takes the row once it has expired, so when the
+    leader dies another process takes over within ttl seconds. on_elected()
+    runs when this process wins the lease, and on_deposed() when it loses it
+    (e.g. it could not renew in time) or releases it on shutdown.
+    """
+
+    def __init__(self, name, on_elected, on_deposed, ttl=15, clock=time.time):
+        self.name = name
+        self.on_elected = on_elected
+        self.on_deposed = on_deposed
+        self.ttl = ttl
+        self.clock = clock
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.leader = False
+        self._held_until = 0.0
+        self._stop = threading.Event()
+
+    def try_acquire(self):
+        """Take or renew the lease. Returns True while this process holds it."""
+        conn = get_db()
+        cursor = conn.cursor()
+        now = self.clock()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute(
+                "INSERT INTO leases (name, owner, expires_at, heartbeat_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at, "
+                "heartbeat_at = excluded.heartbeat_at WHERE leases.owner = excluded.owner OR leases.expires_at < ?",
+                (self.name, self.owner, now + self.ttl, now, now)
+            )
+            held = cursor.rowcount == 1
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if held:
+            self._held_until = now + self.ttl
+        return held
+
+    def poll(self):
+        try:
+            held = self.try_acquire()
+        except Exception as e:
+            print(f"[Leader] lease check failed: {e}")
+            release_db()
+            held = self.leader and self.clock() < self._held_until
+        if held and not self.leader:
+            self.leader = True
+            print(f"[Leader] {self.owner} now runs the {self.name}")
+            self.on_elected()
+        elif not held and self.leader:
+            self.leader = False
+            print(f"[Leader] {self.owner} lost the {self.name} lease")
+            self.on_deposed()
+
+    def start(self):
+        threading.Thread(target=self._loop, name=f"{self.name}-lease", daemon=True).start()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.poll()
+            self._stop.wait(self.ttl / 3)
+
+    def release(self):
+        """Stop polling and hand the lease over at once (worker shutdown)."""
+        self._stop.set()
+        if not self.leader:
+            return
+        self.leader = False
+        self.on_deposed()
+        try:
+            conn = get_db()
+            conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (self.name, self.owner))
+            conn.commit()
+        except Exception as e:
+            print(f"[Leader] releasing the {self.name} lease failed: {e}")
+            release_db()
@@ -0,0 +1,166 @@
+# ===============================
+#  Nyaa listing parsers
+# ===============================
+import re
+from collections import namedtuple
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+except ImportError:  # BeautifulSoup fallback only
+    lxml = None
+
+ListingRow = namedtuple('ListingRow', ['title', 'magnet', 'size', 'date', 'seeders', 'torrent_id'])
+
+# Column positions in table.torrent-list rows
+COL_NAME, COL_LINKS, COL_SIZE, COL_DATE, COL_SEEDERS = 1, 2, 3, 4, 5
+
+
+_VIEW_ID = re.compile(r'/view/(\d+)')
+
+
+def torrent_id_from_url(url):
+    """nyaa's numeric torrent id from a /view/<id> link or RSS guid, or None."""
+    match = _VIEW_ID.search(url or '')
+    return int(match.group(1)) if match else None
+
+
+def _to_int(text):
+    try:
+        return int(text)
+    except (TypeError, ValueError):
+        return 0
+
+
+# ---- lxml backend -------------------------------------------------------
+def _lxml_rows(doc):
+    for tr in doc.xpath("//table[contains(concat(' ', normalize-space(@class), ' '), ' torrent-list ')]/tbody/tr"):
+        tds = [child for child in tr if child.tag == 'td']
+        if len(tds) <= COL_NAME:
+            continue
+
+        title_el = None
+        for a in tds[COL_NAME].iter('a'):
+            if 'comments' not in (a.get('class') or '').split():
+                title_el = a
+                break
+        if title_el is None:
+            continue
+
+        magnet = None
+        if len(tds) > COL_LINKS:
+            for a in tds[COL_LINKS].iter('a'):
+                href = a.get('href') or ''
+                if href.startswith('magnet:'):
+                    magnet = href
+                    break
+        if magnet is None:
+            continue
+
+        yield ListingRow(
+            title_el.text_content().strip(),
+            magnet,
+            tds[COL_SIZE].text_content().strip() if len(tds) > COL_SIZE else '',
+            tds[COL_DATE].text_content().strip() if len(tds) > COL_DATE else '',
+            _to_int(tds[COL_SEEDERS].text_content().strip()) if len(tds) > COL_SEEDERS else 0,
+            torrent_id_from_url(title_el.get('href')),
+        )
+
+
+def _lxml_total_pages(doc):
+    pages = []
+    for link in doc.xpath("//ul[contains(concat(' ', normalize-space(@class), ' '), ' pagination ')]//li//a"):
+        try:
+            pages.append(int(link.text_content().strip()))
+        except ValueError:
+            continue
+    if pages:
+        return max(pages)
+
+    for li in doc.xpath("//ul[contains(concat(' ', normalize-space(@class), ' '), ' pagination ')]//li"):
+        classes = (li.get('class') or '').split()
+        if 'next' in classes:
+            return 1 if 'disabled' in classes else 2
+    return 1
+
+
+def _parse_lxml(html):
+    doc = lxml.html.fromstring(html)
+    return _lxml_rows(doc), _lxml_total_pages(doc)
+
+
+# ---- BeautifulSoup backend ----------------------------------------------
+def _bs4_rows(soup):
+    for tr in soup.select('table.torrent-list > tbody > tr'):
+        tds = tr.find_all('td', recursive=False)
+        if len(tds) <= COL_NAME:
+            continue
+
+        title_el = None
+        for a in tds[COL_NAME].find_all('a'):
+            if 'comments' not in (a.get('class') or []):
+                title_el = a
+                break
+        if title_el is None:
+            continue
+
+        magnet = None
+        if len(tds) > COL_LINKS:
+            for a in tds[COL_LINKS].find_all('a', href=True):
+                if a['href'].startswith('magnet:'):
+                    magnet = a['href']
+                    break
+        if magnet is None:
+            continue
+
+        yield ListingRow(
+            title_el.text.strip(),
+            magnet,
+            tds[COL_SIZE].text.strip() if len(tds) > COL_SIZE else '',
+            tds[COL_DATE].text.strip() if len(tds) > COL_DATE else '',
+            _to_int(tds[COL_SEEDERS].text.strip()) if len(tds) > COL_SEEDERS else 0,
+            torrent_id_from_url(title_el.get('href')),
+        )
+
+
+def _bs4_total_pages(soup):
+    pages = []
+    for page_link in soup.select('ul.pagination li a'):
+        try:
+            pages.append(int(page_link.text.strip()))
+        except ValueError:
+            continue
+    if pages:
+        return max(pages)
+
+    next_link = soup.select_one('ul.pagination li.next')
+    if next_link and not next_link.get('class', []).count('disabled'):
+        return 2
+    return 1
+
+
+def _parse_bs4(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    return _bs4_rows(soup), _bs4_total_pages(soup)
+
+
+BACKENDS = {'lxml': _parse_lxml, 'bs4': _parse_bs4}
+
+
+def resolve_backend(name):
+    """'auto' picks lxml when it is installed; an unavailable lxml falls back to bs4."""
+    if name in ('auto', 'lxml') and lxml is not None:
+        return 'lxml'
+    return 'bs4'
+
+
+def parse_listing(body, backend='auto'):
+    """Parse one listing page.
+
+    Returns (rows, total_pages) where rows is a generator of ListingRow,
+    walking every <tr> once. body may be bytes (decoded as UTF-8) or str.
+    """
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', 'replace')
+    return BACKENDS[resolve_backend(backend)](body)
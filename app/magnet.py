@@ -0,0 +1,33 @@
+# ===============================
+#  Magnet link helpers
+# ===============================
+import base64
+import binascii
+import re
+
+_BTIH = re.compile(r'xt=urn:btih:([0-9a-zA-Z]+)')
+
+
+def extract_infohash(magnet):
+    """Lower-case hex BitTorrent v1 infohash of a magnet link, or None.
+
+    Accepts both the 40-char hex and the 32-char base32 forms.
+    """
+    if not magnet:
+        return None
+    match = _BTIH.search(magnet)
+    if not match:
+        return None
+    value = match.group(1)
+    if len(value) == 40:
+        try:
+            int(value, 16)
+        except ValueError:
+            return None
+        return value.lower()
+    if len(value) == 32:
+        try:
+            return base64.b32decode(value.upper()).hex()
+        except (binascii.Error, ValueError):
+            return None
+    return None
@@ -0,0 +1,278 @@
+# ===============================
+#  Metrics (Prometheus text format)
+# ===============================
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'anime_watchlist_metrics'))
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+FAST_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1)
+
+_lock = threading.Lock()
+_metrics = {}  # name -> metric, in registration order
+_flusher = None
+_flush_lock = threading.Lock()
+
+
+def _label_key(labels):
+    return ','.join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+
+
+def _ensure_flusher():
+    """Each process writes its values to METRICS_DIR/<pid>.json every few seconds.
+
+    Started by the first recorded sample (or start()), never at import.
+    """
+    global _flusher
+    if _flusher is None:
+        _flusher = threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True)
+        _flusher.start()
+
+
+def _after_fork():
+    # a child of a process that already recorded samples (gunicorn's master
+    # runs init_db) starts from zero: the parent's values are in the parent's
+    # own file, and copying them would count them once more per worker. The
+    # locks are replaced because the parent's flusher may have held one at
+    # fork time, and threads do not survive fork, so it needs its own flusher
+    global _lock, _flush_lock, _flusher
+    _lock = threading.Lock()
+    _flush_lock = threading.Lock()
+    _flusher = None
+    for metric in _metrics.values():
+        metric.values = {}
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name, self.help = name, help_text
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+            _ensure_flusher()
+
+    def snapshot(self):
+        return dict(self.values)
+
+
+class Gauge:
+    """Last value per process; processes are combined with max(), and only
+    live processes count. set_function() reads the value at flush time."""
+    kind = 'gauge'
+
+    def __init__(self, name, help_text):
+        self.name, self.help = name, help_text
+        self.values = {}
+        self.function = None
+
+    def set(self, value, **labels):
+        with _lock:
+            self.values[_label_key(labels)] = value
+            _ensure_flusher()
+
+    def set_function(self, function):
+        # stored only: module-level calls must not start the flusher at import
+        self.function = function
+
+    def snapshot(self):
+        values = dict(self.values)
+        if self.function is not None:
+            try:
+                values[''] = self.function()
+            except Exception:
+                pass
+        return values
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name, self.help = name, help_text
+        self.buckets = tuple(buckets)
+        self.values = {}  # label key -> [bucket counts..., sum, count]
+
+    def observe(self, seconds, **labels):
+        key = _label_key(labels)
+        with _lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    state[i] += 1
+            state[-2] += seconds
+            state[-1] += 1
+            _ensure_flusher()
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def snapshot(self):
+        return {key: list(state) for key, state in self.values.items()}
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram, self.labels = histogram, labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+def _register(metric):
+    with _lock:
+        return _metrics.setdefault(metric.name, metric)
+
+
+def counter(name, help_text):
+    return _register(Counter(name, help_text))
+
+
+def gauge(name, help_text):
+    return _register(Gauge(name, help_text))
+
+
+def histogram(name, help_text, buckets=LATENCY_BUCKETS):
+    return _register(Histogram(name, help_text, buckets))
+
+
+def start():
+    """Start this process's flusher now, for gauges read only through
+    set_function(), and delete the files of processes that have exited."""
+    prune()
+    with _lock:
+        _ensure_flusher()
+
+
+# ---- per-process files ----------------------------------------------------
+def flush():
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    with _lock:
+        data = {name: metric.snapshot() for name, metric in _metrics.items()}
+    path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+    tmp = f"{path}.tmp"
+    with _flush_lock:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            flush()
+        except Exception as e:
+            print(f"[Metrics] flush failed: {e}")
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def prune():
+    """Delete the files of exited processes; run when a worker starts, so
+    restarted workers don't leave files behind to be summed forever. Their
+    counts drop out of the totals, which Prometheus reads as a counter reset."""
+    for path in glob.glob(os.path.join(METRICS_DIR, '*.json*')):
+        try:
+            pid = int(os.path.basename(path).split('.')[0])
+        except ValueError:
+            continue
+        if not _alive(pid):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _merge():
+    """Counters and histograms summed over every process file (an exited
+    worker's counts stay until the next worker start prunes them); gauges
+    max() over live ones."""
+    merged = {}
+    for path in glob.glob(os.path.join(METRICS_DIR, '*.json')):
+        try:
+            pid = int(os.path.basename(path).split('.')[0])
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (ValueError, OSError):
+            continue
+        live = _alive(pid)
+        for name, values in data.items():
+            metric = _metrics.get(name)
+            if metric is None or (metric.kind == 'gauge' and not live):
+                continue
+            into = merged.setdefault(name, {})
+            for key, value in values.items():
+                if metric.kind == 'histogram':
+                    total = into.setdefault(key, [0] * len(value))
+                    for i, v in enumerate(value):
+                        total[i] += v
+                elif metric.kind == 'gauge':
+                    into[key] = max(into.get(key, value), value)
+                else:
+                    into[key] = into.get(key, 0) + value
+    return merged
+
+
+def _series(name, key, extra=''):
+    labels = ','.join(part for part in (key, extra) if part)
+    return f"{name}{{{labels}}}" if labels else name
+
+
+def render(live_gauges=None):
+    """Prometheus text exposition of all processes' metrics.
+
+    live_gauges {name: (help, [(labels, value), ...])} are computed by the
+    caller at scrape time and emitted as-is.
+    """
+    flush()
+    merged = _merge()
+    lines = []
+    for name, metric in _metrics.items():
+        lines.append(f"# HELP {name} {metric.help}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        samples = merged.get(name) or ({'': 0} if metric.kind == 'counter' else {})
+        for key, value in sorted(samples.items()):
+            if metric.kind == 'histogram':
+                for bound, count in zip(metric.buckets, value):
+                    le = f'le="{bound}"'
+                    lines.append(f"{_series(name + '_bucket', key, le)} {count}")
+                le = 'le="+Inf"'
+                lines.append(f"{_series(name + '_bucket', key, le)} {value[-1]}")
+                lines.append(f"{_series(name + '_sum', key)} {value[-2]}")
+                lines.append(f"{_series(name + '_count', key)} {value[-1]}")
+            else:
+                lines.append(f"{_series(name, key)} {value}")
+    for name, (help_text, samples) in (live_gauges or {}).items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            lines.append(f"{_series(name, _label_key(labels))} {value}")
+    return '\n'.join(lines) + '\n'
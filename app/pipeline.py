@@ -0,0 +1,142 @@
+# ===============================
+#  Staged pipeline with bounded queues
+# ===============================
+import queue
+import threading
+
+SKIP = None  # a stage returning this drops the item; later stages never see it
+
+_DONE = object()
+_POLL = 0.1  # seconds between checks for a failed run while blocked on a queue
+
+
+class _Aborted(Exception):
+    pass
+
+
+class Stage:
+    """fn(item) -> output (or SKIP), run by `workers` threads."""
+
+    def __init__(self, name, fn, workers=1):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+
+
+class Pipeline:
+    """Feeds items through stages running side by side on their own threads.
+
+    Stages are joined by queues holding at most `maxsize` items, so a slow
+    stage holds back the ones before it instead of letting work pile up in
+    memory. Outputs leave every stage, and reach sink(), in source order even
+    when a stage has several workers. sink runs on the calling thread (which
+    is where per-thread resources like the SQLite connection live). close()
+    stops reading the source; items already inside still finish. The first
+    exception from the source, a stage or sink stops the run and is
+    re-raised by run().
+    """
+
+    def __init__(self, stages, maxsize=2):
+        self.stages = stages
+        self.maxsize = max(1, maxsize)
+        self._closed = threading.Event()
+        self._failed = threading.Event()
+        self._error = None
+
+    def close(self):
+        self._closed.set()
+
+    @property
+    def closed(self):
+        return self._closed.is_set()
+
+    def _fail(self, error):
+        if not self._failed.is_set():
+            self._error = error
+            self._failed.set()
+
+    def _put(self, q, item):
+        while True:
+            try:
+                q.put(item, timeout=_POLL)
+                return
+            except queue.Full:
+                if self._failed.is_set():
+                    raise _Aborted()
+
+    def _get(self, q):
+        while True:
+            try:
+                return q.get(timeout=_POLL)
+            except queue.Empty:
+                if self._failed.is_set():
+                    raise _Aborted()
+
+    def _feed(self, source, out):
+        try:
+            for seq, item in enumerate(source):
+                if self._closed.is_set():
+                    break
+                self._put(out, (seq, item))
+            self._put(out, _DONE)
+        except _Aborted:
+            pass
+        except Exception as e:
+            self._fail(e)
+
+    def _start_stage(self, stage, inbox, out):
+        lock = threading.Lock()
+        pending = {}
+        state = {'next': 0, 'sent': 0, 'running': stage.workers}
+
+        def emit(seq, item):
+            # release outputs strictly in input order, renumbered so the next
+            # stage sees no gaps where items were skipped
+            with lock:
+                pending[seq] = item
+                while state['next'] in pending:
+                    item = pending.pop(state['next'])
+                    state['next'] += 1
+                    if item is not SKIP:
+                        self._put(out, (state['sent'], item))
+                        state['sent'] += 1
+
+        def work():
+            try:
+                while True:
+                    entry = self._get(inbox)
+                    if entry is _DONE:
+                        self._put(inbox, _DONE)  # let sibling workers see it too
+                        break
+                    seq, item = entry
+                    emit(seq, stage.fn(item))
+                with lock:
+                    state['running'] -= 1
+                    last = state['running'] == 0
+                if last:
+                    self._put(out, _DONE)
+            except _Aborted:
+                pass
+            except Exception as e:
+                self._fail(e)
+
+        for n in range(stage.workers):
+            threading.Thread(target=work, name=f"pipeline-{stage.name}-{n}", daemon=True).start()
+
+    def run(self, source, sink=lambda item: None):
+        queues = [queue.Queue(self.maxsize) for _ in range(len(self.stages) + 1)]
+        threading.Thread(target=self._feed, args=(source, queues[0]), name="pipeline-source", daemon=True).start()
+        for stage, inbox, out in zip(self.stages, queues, queues[1:]):
+            self._start_stage(stage, inbox, out)
+        try:
+            while True:
+                entry = self._get(queues[-1])
+                if entry is _DONE:
+                    break
+                sink(entry[1])
+        except _Aborted:
+            pass
+        except Exception as e:
+            self._fail(e)
+        if self._error is not None:
+            raise self._error
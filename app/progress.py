@@ -0,0 +1,88 @@
+# ===============================
+#  Task progress bus
+# ===============================
+import json
+import os
+import threading
+import time
+
+TERMINAL_STATUSES = ('completed', 'failed')
+
+
+class ProgressBus:
+    """Task progress events, shared by every gunicorn worker.
+
+    Events are appended as JSON lines to one spool file per task, so a
+    stream served by any worker can tail them; streams in the publishing
+    process are woken at once, others notice within poll_interval. A line's
+    end offset doubles as its SSE event id, which lets clients resume.
+    """
+
+    def __init__(self, spool_dir, poll_interval=0.5, keepalive=15, max_age=86400):
+        self.spool_dir = spool_dir
+        self.poll_interval = poll_interval
+        self.keepalive = keepalive
+        self.max_age = max_age
+        self._changed = threading.Condition()  # spool_dir is created by the first publish, not at import
+
+    def _path(self, task_id):
+        return os.path.join(self.spool_dir, f"task-{int(task_id)}.jsonl")
+
+    def publish(self, task_id, *events):
+        if not events:
+            return
+        lines = ''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in events)
+        try:
+            f = open(self._path(task_id), 'a', encoding='utf-8')
+        except FileNotFoundError:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            f = open(self._path(task_id), 'a', encoding='utf-8')
+        with f:
+            f.write(lines)
+        with self._changed:
+            self._changed.notify_all()
+
+    def prune(self):
+        """Drop spool files of tasks untouched for max_age seconds."""
+        cutoff = time.time() - self.max_age
+        try:
+            names = os.listdir(self.spool_dir)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.spool_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def follow(self, task_id, offset=0, timeout=45):
+        """Yield (offset, event) for task_id's events after offset, as they arrive.
+
+        Yields (offset, None) as a keepalive when nothing happened for a
+        while. Ends after a completed/failed status event or after timeout
+        seconds (clients reconnect from the last offset).
+        """
+        path = self._path(task_id)
+        deadline = time.monotonic() + timeout
+        quiet_since = time.monotonic()
+        while time.monotonic() < deadline:
+            try:
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    data = f.read()
+            except FileNotFoundError:
+                data = b''
+            for line in data[:data.rfind(b'\n') + 1].splitlines(keepends=True):
+                offset += len(line)
+                event = json.loads(line)
+                yield offset, event
+                quiet_since = time.monotonic()
+                if event.get('type') == 'status' and event.get('status') in TERMINAL_STATUSES:
+                    return
+            if time.monotonic() - quiet_since >= self.keepalive:
+                yield offset, None
+                quiet_since = time.monotonic()
+            with self._changed:
+                self._changed.wait(self.poll_interval)
@@ -0,0 +1,79 @@
+# ===============================
+#  qBittorrent WebUI client
+# ===============================
+import threading
+
+
+class QBittorrentClient:
+    """Long-lived WebUI client.
+
+    Keeps the SID cookie on one pooled session, logs in lazily and only
+    again when the WebUI answers 403, and adds many magnets per request.
+    Safe to share between threads. With a guard (upstream.UpstreamGuard)
+    every call is rate limited and fails fast while its circuit is open.
+    """
+
+    def __init__(self, base_url, username, password, session, timeout, guard=None):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.session = session
+        self.timeout = timeout
+        self.guard = guard
+        self._lock = threading.Lock()
+        self._generation = 0      # bumped on every successful login
+        self._logged_in = False
+
+    def _send(self, method, url, **kwargs):
+        send = lambda: self.session.request(method, url, timeout=self.timeout, **kwargs)
+        return self.guard.call(send) if self.guard else send()
+
+    def login(self):
+        res = self._send(
+            "POST", f"{self.base_url}/api/v2/auth/login",
+            data={"username": self.username, "password": self.password}
+        )
+        # qBittorrent answers 200 "Fails." on bad credentials
+        ok = res.status_code == 200 and res.text.strip() != "Fails."
+        if ok:
+            self._generation += 1
+        self._logged_in = ok
+        return ok
+
+    def _ensure_login(self, seen_generation=None):
+        with self._lock:
+            # another thread may have re-logged in while we waited
+            if self._logged_in and seen_generation != self._generation:
+                return
+            self.login()
+
+    def _request(self, method, path, **kwargs):
+        if not self._logged_in:
+            self._ensure_login()
+        generation = self._generation
+        url = f"{self.base_url}{path}"
+        res = self._send(method, url, **kwargs)
+        if res.status_code == 403:
+            self._ensure_login(generation)
+            res = self._send(method, url, **kwargs)
+        return res
+
+    def add_torrents(self, magnets):
+        """Submit all magnets in one /torrents/add call. Returns True on success."""
+        magnets = [m for m in magnets if m]
+        if not magnets:
+            return True
+        res = self._request("POST", "/api/v2/torrents/add", data={"urls": "\n".join(magnets)})
+        return res.status_code == 200
+
+    def sync_maindata(self, rid=0):
+        """/sync/maindata since response id rid, as a dict, or None on failure.
+
+        qBittorrent sends only torrents (and fields) changed since rid, plus
+        torrents_removed; for rid 0, or a rid it no longer knows, it sends
+        everything with full_update set. The reply's 'rid' goes into the next call.
+        """
+        res = self._request("GET", "/api/v2/sync/maindata", params={"rid": rid})
+        if res.status_code != 200:
+            return None
+        return res.json()
@@ -0,0 +1,75 @@
+# ===============================
+#  Compact scraped-result records
+# ===============================
+import re
+from calendar import timegm
+from collections import namedtuple
+from datetime import datetime, timezone
+
+_SIZE = re.compile(r'^\s*([\d.]+)\s*([KMGTP]?i?B|Bytes)\s*$', re.IGNORECASE)
+_SIZE_UNITS = {'b': 1, 'bytes': 1, 'kib': 1 << 10, 'mib': 1 << 20, 'gib': 1 << 30, 'tib': 1 << 40, 'pib': 1 << 50,
+               'kb': 10 ** 3, 'mb': 10 ** 6, 'gb': 10 ** 9, 'tb': 10 ** 12, 'pb': 10 ** 15}
+_LISTING_DATE = "%Y-%m-%d %H:%M"  # nyaa prints listing dates in UTC
+
+
+class Release(namedtuple('Release', ['title', 'episode', 'magnet', 'infohash', 'size', 'timestamp',
+                                     'seeders', 'is_movie', 'torrent_id'])):
+    """One parsed torrent: size in bytes and timestamp in epoch seconds (0 when unknown)."""
+    __slots__ = ()
+
+    @property
+    def size_text(self):
+        return format_size(self.size)
+
+    @property
+    def date_text(self):
+        return datetime.fromtimestamp(self.timestamp, timezone.utc).strftime(_LISTING_DATE) if self.timestamp else ''
+
+
+def parse_size(value):
+    """'1.4 GiB' -> bytes; ints pass through, anything unreadable is 0."""
+    if isinstance(value, int):
+        return value
+    match = _SIZE.match(value or '')
+    if not match:
+        return 0
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).lower()])
+
+
+def format_size(size):
+    if not size:
+        return ''
+    for unit in ('B', 'KiB', 'MiB', 'GiB', 'TiB'):
+        if size < 1024 or unit == 'TiB':
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+        size /= 1024
+
+
+def parse_listing_date(value):
+    """'2024-01-05 12:34' (UTC) -> epoch seconds; ints pass through, junk is 0."""
+    if isinstance(value, int):
+        return value
+    try:
+        return timegm(datetime.strptime((value or '').strip(), _LISTING_DATE).timetuple())
+    except ValueError:
+        return 0
+
+
+def episode_key(episode):
+    return episode if episode != -1 else 99999  # batches and unknowns last
+
+
+def episode_order(results):
+    """Results of one listing page by ascending episode, keeping listing
+    order within an episode.
+
+    A bucket pass: one list per distinct episode and a sort over the (few)
+    episode numbers instead of over every row. Pages are ordered one at a
+    time; nothing merges them.
+    """
+    buckets = {}
+    for r in results:
+        buckets.setdefault(r.episode, []).append(r)
+    for episode in sorted(buckets, key=episode_key):
+        yield from buckets[episode]
+
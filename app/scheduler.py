@@ -0,0 +1,135 @@
+# ===============================
+#  Watchlist scheduler core
+# ===============================
+import heapq
+import itertools
+import re
+import threading
+import time
+
+_INTERVAL = re.compile(r'^\s*(\d+)\s*([a-z]*)\s*$')
+_UNIT_SECONDS = {
+    '': 60, 's': 1, 'sec': 1, 'm': 60, 'min': 60, 'minute': 60, 'minutes': 60,
+    'h': 3600, 'hour': 3600, 'hours': 3600, 'd': 86400, 'day': 86400, 'days': 86400,
+}
+
+
+def parse_interval(value, default):
+    """'15min', '2h', '1d', '45' (minutes) -> seconds; 'global' or junk -> default."""
+    match = _INTERVAL.match((value or '').lower())
+    if not match or match.group(2) not in _UNIT_SECONDS:
+        return default
+    seconds = int(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+    return seconds if seconds > 0 else default
+
+
+class WatchlistScheduler:
+    """One min-heap of (next_due, anime_id) for the whole watchlist.
+
+    load_changes(since_seq) returns anime rows (id, schedule_interval,
+    eligible, updated_seq) changed after since_seq, so only edits are read
+    after the first load. sweep(anime_ids) checks the due shows and returns
+    the ids it actually checked; anything else (deleted rows) is dropped.
+    The optional plan({anime_id: interval}) returns {anime_id: seconds}
+    to wait before the next check of each swept show; shows it leaves out
+    wait their interval. The loop sleeps until the earliest due entry or the
+    next change poll.
+    """
+
+    def __init__(self, load_changes, sweep, default_interval, refresh_every=30, clock=time.time, plan=None):
+        self.load_changes = load_changes
+        self.sweep = sweep
+        self.plan = plan
+        self.default_interval = default_interval
+        self.refresh_every = refresh_every
+        self.clock = clock
+        self.heap = []
+        self.entries = {}  # anime_id -> {'interval', 'generation', 'last_run'}
+        self._generations = itertools.count()  # stale heap items never match a live entry
+        self.last_seq = 0
+        self.lag = 0.0  # how late the latest sweep started, in seconds
+        self._next_refresh = 0
+        self._stop = threading.Event()
+
+    def refresh(self):
+        now = self.clock()
+        for row in self.load_changes(self.last_seq):
+            self.last_seq = max(self.last_seq, row['updated_seq'])
+            anime_id = row['id']
+            entry = self.entries.get(anime_id)
+            if not row['eligible']:
+                self.entries.pop(anime_id, None)
+                continue
+
+            interval = parse_interval(row['schedule_interval'], self.default_interval)
+            if entry and entry['interval'] == interval:
+                continue
+            last_run = entry['last_run'] if entry else None
+            generation = next(self._generations)
+            self.entries[anime_id] = {'interval': interval, 'generation': generation, 'last_run': last_run}
+            due = (last_run or now) + interval
+            heapq.heappush(self.heap, (due, anime_id, generation))
+        self._next_refresh = now + self.refresh_every
+
+    def _pop_due(self, now):
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due_at, anime_id, generation = heapq.heappop(self.heap)
+            entry = self.entries.get(anime_id)
+            if entry and entry['generation'] == generation:
+                if not due:
+                    self.lag = now - due_at
+                due.append((anime_id, generation))
+        return due
+
+    def run_pending(self):
+        """Sweep every entry that is due and queue its next run. Returns the ids swept."""
+        due = self._pop_due(self.clock())
+        if not due:
+            return []
+        ids = [anime_id for anime_id, _ in due]
+        try:
+            checked = set(self.sweep(ids))
+        except Exception as e:
+            print("Scheduler sweep error:", e)
+            checked = set(ids)  # try again next interval instead of dropping them
+        delays = self._plan_delays(checked)
+        now = self.clock()
+        for anime_id, generation in due:
+            entry = self.entries.get(anime_id)
+            if entry is None or entry['generation'] != generation:
+                continue  # removed or rescheduled by refresh() meanwhile
+            if anime_id not in checked:
+                del self.entries[anime_id]
+                continue
+            entry['last_run'] = now
+            heapq.heappush(self.heap, (now + delays.get(anime_id, entry['interval']), anime_id, generation))
+        return ids
+
+    def _plan_delays(self, anime_ids):
+        intervals = {i: self.entries[i]['interval'] for i in anime_ids if i in self.entries}
+        if self.plan is None or not intervals:
+            return {}
+        try:
+            return self.plan(intervals)
+        except Exception as e:
+            print("Scheduler plan error:", e)
+            return {}
+
+    def seconds_until_next(self):
+        next_due = self.heap[0][0] if self.heap else float('inf')
+        return max(0.0, min(next_due, self._next_refresh) - self.clock())
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                if self.clock() >= self._next_refresh:
+                    self.refresh()
+                self.run_pending()
+            except Exception as e:
+                print("Scheduler loop error:", e)
+                self._next_refresh = self.clock() + self.refresh_every
+            self._stop.wait(self.seconds_until_next())
+
+    def stop(self):
+        self._stop.set()
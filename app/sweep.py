@@ -0,0 +1,84 @@
+# ===============================
+#  Async fan-out for scheduled sweeps
+# ===============================
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+
+async def _gather(items, fetch, concurrency, timeout, executor):
+    loop = asyncio.get_running_loop()
+    gate = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(item):
+        async with gate:
+            try:
+                result = await asyncio.wait_for(loop.run_in_executor(executor, fetch, item), timeout)
+                return item, result, None
+            except asyncio.TimeoutError:
+                return item, None, TimeoutError(f"no response after {timeout}s")
+            except Exception as e:
+                return item, None, e
+
+    return await asyncio.gather(*(one(item) for item in items))
+
+
+def fan_out(items, fetch, concurrency=8, timeout=60):
+    """Run fetch(item) for every item concurrently, at most `concurrency` at once.
+
+    fetch is blocking (requests); it runs on a private thread pool driven by an
+    event loop, each call bounded by `timeout` seconds. Returns
+    [(item, result, error)] in input order, with error set instead of raising.
+    A timed-out call is abandoned, not interrupted: its thread finishes in the
+    background and its result is dropped.
+    """
+    items = list(items)
+    if not items:
+        return []
+    executor = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(items))),
+                                  thread_name_prefix="sweep-fetch")
+    try:
+        return asyncio.run(_gather(items, fetch, concurrency, timeout, executor))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class Deadline:
+    """Blocking calls with a time limit, for pipeline stages.
+
+    call(fetch, item) returns (item, result, error) like fan_out(); a call
+    running past `timeout` seconds is abandoned the same way. The limit
+    counts from when fetch starts, not from submission: an abandoned call
+    keeps its pool thread until it returns, and the calls queued behind it
+    must not spend their own limit waiting. Use as a context manager so the
+    private pool is shut down afterwards.
+    """
+
+    def __init__(self, concurrency=8, timeout=60):
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="sweep-fetch")
+
+    def call(self, fetch, item):
+        started = threading.Event()
+
+        def run():
+            started.set()
+            return fetch(item)
+
+        future = self.executor.submit(run)
+        try:
+            while not started.wait(1):
+                if future.done():  # cancelled by shutdown before it ran
+                    break
+            return item, future.result(timeout=self.timeout), None
+        except FutureTimeout:
+            future.cancel()
+            return item, None, TimeoutError(f"no response after {self.timeout}s")
+        except Exception as e:
+            return item, None, e
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.executor.shutdown(wait=False, cancel_futures=True)
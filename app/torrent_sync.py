@@ -0,0 +1,93 @@
+# ===============================
+#  qBittorrent state sync
+# ===============================
+import threading
+import time
+
+from db import get_db, release_db
+
+# /sync/maindata torrent fields mirrored into torrent_state
+COLUMNS = ('name', 'state', 'progress', 'size', 'dlspeed', 'eta', 'added_on', 'completion_on')
+
+
+def apply_maindata(cursor, data, now=None):
+    """Fold one /sync/maindata reply into torrent_state; the caller commits.
+
+    Delta replies carry only the changed fields of changed torrents, so each
+    is upserted with just those columns. Torrents qBittorrent removed (or
+    that a full snapshot no longer lists) are kept with state 'deleted' so
+    history can show it. Returns the number of torrents touched.
+    """
+    now = int(now if now is not None else time.time())
+    torrents = data.get('torrents') or {}
+    if data.get('full_update'):
+        cursor.execute(
+            "UPDATE torrent_state SET state = 'deleted', dlspeed = 0, eta = NULL, updated_at = ? "
+            "WHERE state IS NOT 'deleted'", (now,)
+        )
+    for infohash, fields in torrents.items():
+        columns = [c for c in COLUMNS if c in fields]
+        updates = ''.join(f", {c} = excluded.{c}" for c in columns)
+        cursor.execute(
+            f"INSERT INTO torrent_state (infohash, updated_at{''.join(', ' + c for c in columns)}) "
+            f"VALUES (?, ?{', ?' * len(columns)}) "
+            f"ON CONFLICT (infohash) DO UPDATE SET updated_at = excluded.updated_at{updates}",
+            (infohash.lower(), now, *(fields[c] for c in columns))
+        )
+    removed = data.get('torrents_removed') or []
+    cursor.executemany(
+        "UPDATE torrent_state SET state = 'deleted', dlspeed = 0, eta = NULL, updated_at = ? WHERE infohash = ?",
+        [(now, infohash.lower()) for infohash in removed]
+    )
+    return len(torrents) + len(removed)
+
+
+class TorrentStateSync:
+    """Keeps torrent_state in step with qBittorrent by polling /sync/maindata.
+
+    Each poll passes the rid of the previous reply, so qBittorrent answers
+    with what changed since then: an idle client costs one tiny request and
+    no writes however many torrents it holds.
+    """
+
+    def __init__(self, client, interval=15):
+        self.client = client
+        self.interval = interval
+        self.rid = 0
+        self._stop = threading.Event()
+
+    def sync_once(self):
+        """Apply one poll. Returns the number of torrents touched, or None
+        when qBittorrent could not be asked."""
+        data = self.client.sync_maindata(self.rid)
+        if data is None:
+            return None
+        conn = get_db()
+        try:
+            changed = apply_maindata(conn.cursor(), data)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        self.rid = data.get('rid', 0)
+        return changed
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        self._stop = stop = threading.Event()
+        threading.Thread(target=self._loop, args=(stop,), name="qbittorrent-sync", daemon=True).start()
+        print(f"[qBittorrent] syncing torrent state every {self.interval}s")
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self, stop):
+        while not stop.is_set():
+            try:
+                self.sync_once()
+            except Exception as e:
+                print(f"[qBittorrent] state sync failed: {e}")
+                self.rid = 0  # start over with a full snapshot
+                release_db()
+            stop.wait(self.interval)
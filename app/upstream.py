@@ -0,0 +1,154 @@
+# ===============================
+#  Shared upstream rate limit and circuit breaker
+# ===============================
+import os
+import sqlite3
+import threading
+import time
+
+import metrics
+
+UPSTREAM_WAIT_SECONDS = metrics.histogram('upstream_wait_seconds', 'Time spent waiting for an upstream rate-limit token')
+UPSTREAM_REJECTED = metrics.counter('upstream_rejected_total', 'Upstream calls failed fast by an open circuit or a long queue')
+UPSTREAM_FAILURES = metrics.counter('upstream_failures_total', 'Upstream calls that failed, timed out or were throttled')
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+class UpstreamGuard:
+    """Token bucket plus circuit breaker for one upstream, in a SQLite file
+    shared by every gunicorn worker and thread.
+
+    The bucket refills at `rate` tokens/second up to `burst`. Interactive
+    callers (interactive() is true, e.g. inside a Flask request) need one
+    token; background callers need `reserve` more, so a search finds tokens
+    left even while a backfill keeps the bucket drained. `threshold`
+    failures in a row (errors, timeouts, 5xx) or one 429 open the circuit
+    for `cooldown` seconds (or Retry-After); while open, acquire() raises
+    UpstreamUnavailable at once. The first caller after that is let through
+    as a trial, and its result closes or reopens the circuit.
+    """
+
+    def __init__(self, path, name, rate, burst, reserve=None, threshold=5, cooldown=30,
+                 max_wait=60, interactive=lambda: False):
+        self.path = path
+        self.name = name
+        self.rate = max(rate, 0.001)
+        self.burst = max(burst, 1)
+        self.reserve = min(self.burst / 2 if reserve is None else reserve, self.burst - 1)
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_wait = max_wait
+        self.interactive = interactive
+        self._local = threading.local()
+
+    def _db(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS upstreams (
+                    name TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    failures INTEGER NOT NULL DEFAULT 0,
+                    open_until REAL NOT NULL DEFAULT 0
+                )
+            ''')
+            self._local.conn = conn
+        return conn
+
+    def _take(self, needed):
+        """One locked attempt: 0 when a token was taken, else seconds to wait."""
+        db = self._db()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT tokens, updated_at, failures, open_until FROM upstreams WHERE name = ?", (self.name,)
+            ).fetchone()
+            tokens, updated_at, failures, open_until = row or (self.burst, now, 0, 0)
+            if open_until > now:
+                db.execute("COMMIT")
+                raise UpstreamUnavailable(f"{self.name} circuit open for another {open_until - now:.0f}s")
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            wait = 0.0
+            if tokens >= needed:
+                tokens -= 1
+                if failures >= self.threshold:
+                    open_until = now + self.cooldown  # half-open: only this trial call goes through
+            else:
+                wait = (needed - tokens) / self.rate
+            db.execute(
+                "INSERT OR REPLACE INTO upstreams (name, tokens, updated_at, failures, open_until) VALUES (?, ?, ?, ?, ?)",
+                (self.name, tokens, now, failures, open_until)
+            )
+            db.execute("COMMIT")
+            return wait
+        except sqlite3.Error:
+            db.execute("ROLLBACK")
+            raise
+
+    def acquire(self):
+        """Block until a token is free; raises UpstreamUnavailable when the
+        circuit is open or the wait would exceed max_wait."""
+        needed = 1 if self.interactive() else 1 + self.reserve
+        started = time.monotonic()
+        try:
+            while True:
+                wait = self._take(needed)
+                if wait == 0:
+                    break
+                if time.monotonic() - started + wait > self.max_wait:
+                    raise UpstreamUnavailable(f"{self.name} rate limit: no token within {self.max_wait}s")
+                time.sleep(wait)
+        except UpstreamUnavailable:
+            UPSTREAM_REJECTED.inc(upstream=self.name)
+            raise
+        UPSTREAM_WAIT_SECONDS.observe(time.monotonic() - started, upstream=self.name)
+
+    def record(self, ok, retry_after=None):
+        """Feed back a call's outcome. A success only writes when it closes the circuit."""
+        db = self._db()
+        now = time.time()
+        if ok:
+            db.execute("UPDATE upstreams SET failures = 0, open_until = 0 WHERE name = ? AND failures > 0", (self.name,))
+            return
+        UPSTREAM_FAILURES.inc(upstream=self.name)
+        if retry_after is not None:
+            db.execute(
+                "UPDATE upstreams SET failures = MAX(failures, ?), open_until = ? WHERE name = ?",
+                (self.threshold, now + retry_after, self.name)
+            )
+            return
+        db.execute(
+            "UPDATE upstreams SET failures = failures + 1, "
+            "open_until = CASE WHEN failures + 1 >= ? THEN ? ELSE open_until END WHERE name = ?",
+            (self.threshold, now + self.cooldown, self.name)
+        )
+
+    def call(self, send):
+        """acquire(), run send() -> requests.Response and record its outcome."""
+        self.acquire()
+        try:
+            res = send()
+        except Exception:
+            self.record(False)
+            raise
+        if res.status_code == 429:
+            self.record(False, retry_after=retry_after_seconds(res, self.cooldown))
+        else:
+            self.record(res.status_code < 500)
+        return res
+
+
+def retry_after_seconds(res, default):
+    try:
+        return max(0.0, float(res.headers.get('Retry-After', default)))
+    except (TypeError, ValueError):
+        return default  # HTTP-date form: just use the cooldown
@@ -0,0 +1,233 @@
+# ===============================
+#  Write-behind buffer for scan and sweep writes
+# ===============================
+import atexit
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from datetime import datetime
+
+import metrics
+from db import get_db
+
+WRITE_BEHIND_FLUSHES = metrics.counter('write_behind_flushes_total', 'Transactions committed by write-behind buffers')
+WRITE_BEHIND_ROWS = metrics.counter('write_behind_rows_total', 'Rows written by write-behind flushes, by table')
+
+_live = weakref.WeakSet()
+_live_lock = threading.Lock()
+
+
+class PendingDownloads:
+    """Infohashes queued in some write-behind buffer and not committed yet,
+    in a SQLite file shared by every gunicorn worker.
+
+    known() is checked next to the downloads ledger, so a /download served
+    by one worker sees what a scan in another has sent to qBittorrent but
+    not flushed. Rows older than `ttl` seconds are ignored and pruned: they
+    belong to a buffer whose process died before flushing.
+    """
+
+    PRUNE_INTERVAL = 60
+
+    def __init__(self, path, ttl=600):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialised = False
+        self._last_prune = 0.0
+
+    def _db(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if not self._initialised:
+                    conn.execute('''
+                        CREATE TABLE IF NOT EXISTS pending (
+                            infohash TEXT PRIMARY KEY,
+                            added_at REAL NOT NULL
+                        )
+                    ''')
+                    self._initialised = True
+            self._local.conn = conn
+        return conn
+
+    def add(self, infohashes):
+        now = time.time()
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany("INSERT OR REPLACE INTO pending (infohash, added_at) VALUES (?, ?)",
+                           [(h, now) for h in infohashes])
+            if now - self._last_prune >= self.PRUNE_INTERVAL:
+                self._last_prune = now
+                db.execute("DELETE FROM pending WHERE added_at < ?", (now - self.ttl,))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def discard(self, infohashes):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany("DELETE FROM pending WHERE infohash = ?", [(h,) for h in infohashes])
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def known(self, infohashes):
+        """Subset of infohashes waiting in a buffer of any process."""
+        infohashes = list(infohashes)
+        if not infohashes:
+            return set()
+        placeholders = ','.join('?' * len(infohashes))
+        rows = self._db().execute(
+            f"SELECT infohash FROM pending WHERE added_at >= ? AND infohash IN ({placeholders})",
+            [time.time() - self.ttl, *infohashes]
+        ).fetchall()
+        return {row[0] for row in rows}
+
+
+class WriteBehind:
+    """Collects the writes of one scan or sweep and commits them together.
+
+    Download rows, last_episode bumps and high-water marks (only the highest
+    per show is kept) and task checkpoints (the latest per task) wait in
+    memory. flush() writes them with executemany in one transaction, so the
+    downloads and the checkpoint covering them land together. maybe_flush()
+    flushes once `interval` seconds passed since the last flush or
+    `max_rows` downloads are waiting (interval 0 means every call). Leaving
+    the `with` block flushes even when the body raised, since the torrents
+    are in qBittorrent already. flush_all() drains every live buffer at
+    shutdown. Queued download infohashes are listed in `pending` (a
+    PendingDownloads) until their flush commits.
+
+    Any thread may add to a buffer; flush() writes through the calling
+    thread's connection. A failed flush rolls back and keeps its rows for
+    the next attempt.
+    """
+
+    def __init__(self, interval=0, max_rows=1000, pending=None):
+        self.interval = interval
+        self.max_rows = max_rows
+        self.pending = pending
+        self._lock = threading.RLock()
+        self._downloads = []
+        self._episodes = {}  # anime_id -> highest last_episode
+        self._marks = {}     # anime_id -> highest last_seen_torrent_id
+        self._tasks = {}     # task_id -> {'current_page': .., 'progress': ..}
+        self._last_flush = time.monotonic()
+        with _live_lock:
+            _live.add(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.flush()
+        except Exception as e:
+            if exc_type is None:
+                raise
+            print(f"[WriteBehind] final flush failed: {e}")
+
+    def add_downloads(self, rows):
+        """rows: (anime_id, episode, magnet_link, download_date, downloaded_at, infohash)."""
+        with self._lock:
+            self._downloads.extend(rows)
+            if self.pending is not None:
+                try:
+                    self.pending.add([row[5] for row in rows if row[5]])
+                except Exception as e:
+                    print(f"[WriteBehind] listing pending infohashes failed: {e}")  # the rows are buffered anyway
+
+    def bump_episode(self, anime_id, episode):
+        with self._lock:
+            if episode > self._episodes.get(anime_id, episode - 1):
+                self._episodes[anime_id] = episode
+
+    def advance_mark(self, anime_id, torrent_id):
+        with self._lock:
+            if torrent_id > self._marks.get(anime_id, 0):
+                self._marks[anime_id] = torrent_id
+
+    def update_task(self, task_id, current_page=None, progress=None):
+        with self._lock:
+            task = self._tasks.setdefault(task_id, {'current_page': None, 'progress': None})
+            if current_page is not None:
+                task['current_page'] = current_page
+            if progress is not None:
+                task['progress'] = progress
+
+    def maybe_flush(self):
+        with self._lock:
+            if (time.monotonic() - self._last_flush >= self.interval
+                    or len(self._downloads) >= self.max_rows):
+                self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not (self._downloads or self._episodes or self._marks or self._tasks):
+                return
+            conn = get_db()
+            try:
+                self._write(conn)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            if self.pending is not None:
+                try:
+                    self.pending.discard([row[5] for row in self._downloads if row[5]])
+                except Exception as e:
+                    print(f"[WriteBehind] clearing pending infohashes failed: {e}")  # they expire after the ttl
+            counts = {'downloads': len(self._downloads), 'anime': len(self._episodes) + len(self._marks),
+                      'tasks': len(self._tasks)}
+            self._downloads, self._episodes, self._marks, self._tasks = [], {}, {}, {}
+        WRITE_BEHIND_FLUSHES.inc()
+        for table, count in counts.items():
+            if count:
+                WRITE_BEHIND_ROWS.inc(count, table=table)
+
+    def _write(self, conn):
+        if self._downloads:
+            conn.executemany(
+                "INSERT OR IGNORE INTO downloads (anime_id, episode, magnet_link, download_date, downloaded_at, infohash) "
+                "VALUES (?, ?, ?, ?, ?, ?)", self._downloads
+            )
+        if self._episodes:
+            conn.executemany("UPDATE anime SET last_episode = ? WHERE id = ? AND last_episode < ?",
+                             [(ep, anime_id, ep) for anime_id, ep in self._episodes.items()])
+        if self._marks:
+            conn.executemany("UPDATE anime SET last_seen_torrent_id = ? WHERE id = ? AND last_seen_torrent_id < ?",
+                             [(mark, anime_id, mark) for anime_id, mark in self._marks.items()])
+        if self._tasks:
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            conn.executemany(
+                "UPDATE tasks SET current_page = COALESCE(?, current_page), progress = COALESCE(?, progress), "
+                "updated_at = ? WHERE id = ?",
+                [(task['current_page'], task['progress'], now, task_id) for task_id, task in self._tasks.items()]
+            )
+
+
+def flush_all():
+    """Flush every live buffer (worker shutdown); failures are logged, not raised."""
+    with _live_lock:
+        buffers = list(_live)
+    for buffer in buffers:
+        try:
+            buffer.flush()
+        except Exception as e:
+            print(f"[WriteBehind] flush at shutdown failed: {e}")
+
+
+atexit.register(flush_all)
@@ -0,0 +1,123 @@
+"""Accuracy and throughput of the episode parser against bench/episode_corpus.tsv.
+
+    python bench/bench_episode_parser.py [--rounds 200] [--json]
+
+Prints one line per mismatch, then accuracy and titles/second for the
+legacy per-pattern loop, the compiled parser with a cold cache and the
+compiled parser with a warm cache (a rescan of the same listing).
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'app'))
+
+from episode_parser import parse_release  # noqa: E402
+
+
+def legacy_parse(title):
+    """The seven-regex loop fetch_magnet_links used before episode_parser."""
+    title_lower = title.lower()
+    if any(batch in title_lower for batch in ['batch', 'complete', '01-', '-complete']):
+        return None
+    is_movie = 'movie' in title_lower or 'film' in title_lower
+    title_for_search = re.sub(r'\[\w{8}\]', '', title_lower)
+    ep_patterns = [
+        r'(?i)(?:^|\s)s\s*(\d{2})\s*e\s*(\d{2})(?=\W|$)',
+        r'(?i)(?:^|\s)s?0*(\d{1,2})e0*(\d{1,3})(?=\W|$)',
+        r'(?:^|\s)(?:ep|episode|e)[\s\.]*(\d{1,4})',
+        r'(?:^|\s)- (\d{1,4})(?=\s|$|\.|_)',
+        r'(?:^|\s)\[(\d{1,4})\](?:\s|$|\.|_)',
+        r'(?:^|\s)e(\d+)(?:\s|$|\.|_)',
+        r'(?<!\d)(\d{1,2})(?!\d)',
+    ]
+    episode = -1
+    for pattern in ep_patterns:
+        match = re.search(pattern, title_for_search)
+        if match:
+            ep = int(match.group(2)) if (match.lastindex == 2) else int(match.group(1))
+            if ep < 5000:
+                episode = ep
+                break
+    if is_movie and episode == -1:
+        episode = 0
+    return episode, is_movie
+
+
+def load_corpus(path):
+    corpus = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip() or line.startswith('#'):
+                continue
+            expected, title = line.rstrip('\n').split('\t', 1)
+            corpus.append((title, None if expected == 'batch' else int(expected)))
+    return corpus
+
+
+def episode_of(parsed):
+    return None if parsed is None else parsed[0]
+
+
+def accuracy(parse, corpus, report=None):
+    hits = 0
+    for title, expected in corpus:
+        got = episode_of(parse(title))
+        if got == expected:
+            hits += 1
+        elif report is not None:
+            report.append((title, expected, got))
+    return hits / len(corpus)
+
+
+def throughput(parse, corpus, rounds, before_round=None):
+    titles = [title for title, _ in corpus]
+    start = time.perf_counter()
+    for _ in range(rounds):
+        if before_round:
+            before_round()
+        for title in titles:
+            parse(title)
+    return len(titles) * rounds / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--corpus', default=os.path.join(HERE, 'episode_corpus.tsv'))
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--json', action='store_true', help="machine-readable output")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    mismatches = []
+    result = {
+        'titles': len(corpus),
+        'accuracy': {
+            'legacy': accuracy(legacy_parse, corpus),
+            'compiled': accuracy(parse_release, corpus, mismatches),
+        },
+        'titles_per_sec': {
+            'legacy': throughput(legacy_parse, corpus, args.rounds),
+            'compiled_cold': throughput(parse_release, corpus, args.rounds, parse_release.cache_clear),
+            'compiled_warm': throughput(parse_release, corpus, args.rounds),
+        },
+    }
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    for title, expected, got in mismatches:
+        print(f"MISS expected={expected} got={got}  {title}")
+    print(f"titles: {result['titles']}")
+    for name, value in result['accuracy'].items():
+        print(f"accuracy {name:<14} {value:6.1%}")
+    for name, value in result['titles_per_sec'].items():
+        print(f"titles/s {name:<14} {value:12,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Peak memory of a long backfill, for comparing revisions.
+
+    python bench/bench_memory.py [--pages 50] [--runs 2] [--compare HEAD~1]
+
+Each target runs in a fresh interpreter against the stub nyaa (generated
+--pages listing) and stub qBittorrent servers with a throwaway database,
+calling download_all_episodes_with_progress --runs times. It reports the
+tracemalloc peak during the backfills and the growth of peak RSS over the
+process's footprint after start-up. --compare REV also runs REV's app/
+code from a temporary git worktree with the same stubs, so the output
+holds a before/after pair.
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+
+def child(args):
+    import stub_nyaa
+    import stub_qbittorrent
+    import tracemalloc
+
+    nyaa = stub_nyaa.start(pages=args.pages)
+    qb = stub_qbittorrent.start()
+    workdir = tempfile.mkdtemp(prefix='anime-membench-')
+    os.environ.update({
+        'NYAA_BASE_URL': f"http://127.0.0.1:{nyaa.server_address[1]}",
+        'QBITTORRENT_HOST': '127.0.0.1',
+        'QBITTORRENT_PORT': str(qb.server_address[1]),
+        'DB_PATH': os.path.join(workdir, 'anime_watchlist.db'),
+        'PROGRESS_SPOOL_DIR': os.path.join(workdir, 'progress'),
+        'METRICS_DIR': os.path.join(workdir, 'metrics'),
+        'UPSTREAM_STATE_PATH': os.path.join(workdir, 'upstream.db'),
+        'SCHEDULER_ENABLED': '0',
+        'HTTP_CACHE_TTL': '0',
+        'NYAA_RATE': '1000', 'NYAA_BURST': '1000', 'QBITTORRENT_RATE': '1000', 'QBITTORRENT_BURST': '1000',
+    })
+    sys.path.insert(0, args.app_dir)
+    import app as anime_app
+    from jobs import enqueue
+
+    anime_app.init_db()
+    conn = anime_app.get_db()
+    cursor = conn.cursor()
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    for n in range(args.runs):
+        cursor.execute("INSERT INTO anime (title, search_query, last_episode, auto_download) VALUES (?, ?, 0, 1)",
+                       (f"Memory Show {n}", f"memory show {n}"))
+        anime_id = cursor.lastrowid
+        task_id = enqueue(cursor, anime_id, 'download_all', total_pages=args.pages)
+        conn.commit()
+        anime_app.download_all_episodes_with_progress(anime_id, f"memory show {n}", task_id)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'runs': args.runs, 'pages': args.pages, 'seconds': round(elapsed, 3),
+        'torrents': qb.stats['torrents'], 'nyaa_requests': nyaa.hits,
+        'tracemalloc_peak_kib': peak // 1024,
+        'rss_growth_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss,  # KiB on Linux
+    }
+
+
+def run_target(app_dir, args):
+    cmd = [sys.executable, os.path.abspath(__file__), '--child', '--app-dir', app_dir,
+           '--pages', str(args.pages), '--runs', str(args.runs)]
+    out = subprocess.run(cmd, check=True, stdout=subprocess.PIPE).stdout
+    return json.loads(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=50, help="listing pages per backfill")
+    parser.add_argument('--runs', type=int, default=2, help="backfills per target")
+    parser.add_argument('--compare', metavar='REV', help="also measure this git revision's app/")
+    parser.add_argument('--out', help="write JSON here instead of stdout")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--app-dir', default=os.path.join(REPO, 'app'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        with contextlib.redirect_stdout(sys.stderr):  # the app logs with print()
+            result = child(args)
+        print(json.dumps(result))
+        return
+
+    results = {'working_tree': run_target(args.app_dir, args)}
+    if args.compare:
+        worktree = tempfile.mkdtemp(prefix='anime-membench-rev-')
+        subprocess.run(['git', 'worktree', 'add', '--detach', worktree, args.compare], cwd=REPO, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            results[args.compare] = run_target(os.path.join(worktree, 'app'), args)
+        finally:
+            subprocess.run(['git', 'worktree', 'remove', '--force', worktree], cwd=REPO,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Check that the lxml and BeautifulSoup listing backends agree, and time them.
+
+    python bench/check_parsers.py [--rounds 20] [fixture.html ...]
+
+Also checks that the RSS path (app.parse_feed on fixtures/rss.xml) yields
+the same Release records as the HTML path on fixtures/page-1.html, which
+lists the same torrents. Exits non-zero when any fixture parses
+differently between backends or the feed disagrees with the listing.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'app'))
+
+import listing_parser  # noqa: E402
+
+
+def parse(body, backend):
+    rows, total_pages = listing_parser.parse_listing(body, backend)
+    return list(rows), total_pages
+
+
+def check_feed(listing_path, feed_path):
+    """True when the feed's Release records equal the listing's, row for row."""
+    import app  # the Flask app; imported here so the backend comparison runs without its dependencies
+
+    with open(listing_path, 'rb') as f:
+        listing = [app.release_from_row(row) for row in parse(f.read(), 'auto')[0]]
+    with open(feed_path, 'rb') as f:
+        feed, items = app.parse_feed(f.read())
+    ok = feed == [r for r in listing if r is not None]
+    print(f"{'ok' if ok else 'MISMATCH':<8} {os.path.basename(feed_path)} vs {os.path.basename(listing_path)}: "
+          f"{len(feed)} of {items} items")
+    if not ok:
+        for a, b in zip(listing, feed):
+            if a != b:
+                print(f"  html: {a}\n  rss:  {b}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--feed', default=os.path.join(HERE, 'fixtures', 'rss.xml'))
+    parser.add_argument('--feed-listing', default=os.path.join(HERE, 'fixtures', 'page-1.html'),
+                        help="listing page holding the same torrents as --feed")
+    parser.add_argument('fixtures', nargs='*')
+    args = parser.parse_args()
+
+    if listing_parser.lxml is None:
+        sys.exit("lxml is not installed; nothing to compare")
+
+    paths = args.fixtures or sorted(glob.glob(os.path.join(HERE, 'fixtures', '*.html')))
+    failed = False
+    timings = {'lxml': 0.0, 'bs4': 0.0}
+
+    for path in paths:
+        with open(path, 'rb') as f:
+            body = f.read()
+        expected = parse(body, 'bs4')
+        got = parse(body, 'lxml')
+        status = 'ok' if got == expected else 'MISMATCH'
+        failed |= got != expected
+        print(f"{status:<8} {os.path.basename(path)}: {len(got[0])} rows, {got[1]} pages")
+        if got != expected:
+            for a, b in zip(expected[0], got[0]):
+                if a != b:
+                    print(f"  bs4:  {a}\n  lxml: {b}")
+
+        for backend in timings:
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                parse(body, backend)
+            timings[backend] += time.perf_counter() - start
+
+    failed |= not check_feed(args.feed_listing, args.feed)
+
+    pages = len(paths) * args.rounds
+    for backend, seconds in timings.items():
+        print(f"{backend:<5} {seconds / pages * 1000:8.2f} ms/page")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
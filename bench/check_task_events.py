@@ -0,0 +1,83 @@
+"""Check that /task-events streams resume and end the way download_status.html expects.
+
+    python bench/check_task_events.py
+
+Runs against a throwaway database with a 1s stream lifetime: a stream cut
+while the task runs must hand back its offset as the event id, and a
+reconnect with that Last-Event-ID after the task completed must still get
+the final 'completed' status. Exits non-zero on the first failed check.
+"""
+import json
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+workdir = tempfile.mkdtemp(prefix='anime-sse-check-')
+os.environ.update({
+    'DB_PATH': os.path.join(workdir, 'anime_watchlist.db'),
+    'PROGRESS_SPOOL_DIR': os.path.join(workdir, 'progress'),
+    'METRICS_DIR': os.path.join(workdir, 'metrics'),
+    'UPSTREAM_STATE_PATH': os.path.join(workdir, 'upstream.db'),
+    'SCHEDULER_ENABLED': '0',
+    'TASK_EVENTS_STREAM_SECONDS': '1',
+})
+sys.path.insert(0, os.path.join(HERE, '..', 'app'))
+
+import app as anime_app  # noqa: E402
+from jobs import enqueue  # noqa: E402
+
+
+def events(body):
+    """[(id, event type, data)] of an SSE body; bare 'id:' blocks come back with type None."""
+    parsed = []
+    for block in body.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line and not line.startswith(':'))
+        if 'id' in fields or 'event' in fields:
+            parsed.append((fields.get('id'), fields.get('event'),
+                           json.loads(fields['data']) if 'data' in fields else None))
+    return parsed
+
+
+def last_id(parsed):
+    return [event_id for event_id, _, _ in parsed if event_id][-1]
+
+
+def check(label, ok):
+    print(f"{'ok' if ok else 'FAILED':<7} {label}")
+    if not ok:
+        sys.exit(1)
+
+
+def main():
+    anime_app.init_db()
+    conn = anime_app.get_db()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO anime (title, search_query, last_episode, auto_download) VALUES ('SSE', 'sse', 0, 1)")
+    anime_id = cursor.lastrowid
+    task_id = enqueue(cursor, anime_id, 'download_all', total_pages=2)
+    cursor.execute("UPDATE tasks SET status = 'running' WHERE id = ?", (task_id,))
+    conn.commit()
+    client = anime_app.app.test_client()
+
+    anime_app.progress_bus.publish(task_id, {'type': 'page', 'status': 'running', 'page': 1,
+                                             'current_page': 1, 'total_pages': 2, 'progress': 50})
+    first = events(client.get(f"/task-events/{anime_id}").get_data(as_text=True))
+    check("live stream sends the snapshot and page 1", [kind for _, kind, _ in first][:2] == ['status', 'page'])
+    check("a stream cut by its lifetime ends with an id", first[-1][1] is None and first[-1][0] is not None)
+
+    anime_app.progress_bus.publish(task_id, {'type': 'page', 'status': 'running', 'page': 2,
+                                             'current_page': 2, 'total_pages': 2, 'progress': 100})
+    resumed = events(client.get(f"/task-events/{anime_id}", headers={'Last-Event-ID': last_id(first)})
+                     .get_data(as_text=True))
+    check("a reconnect resumes after the last event", [data['page'] for _, kind, data in resumed if kind == 'page'] == [2])
+
+    anime_app.finish_task(cursor, conn, task_id, 'completed')
+    final = events(client.get(f"/task-events/{anime_id}", headers={'Last-Event-ID': last_id(resumed)})
+                   .get_data(as_text=True))
+    check("a reconnect after completion gets the final status",
+          any(kind == 'status' and data['status'] == 'completed' for _, kind, data in final))
+
+
+if __name__ == '__main__':
+    main()
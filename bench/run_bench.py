@@ -0,0 +1,203 @@
+"""End-to-end benchmark of the scrape -> parse -> add pipeline against local stubs.
+
+    python bench/run_bench.py [--shows 20] [--backfill 3] [--pages 5 | --fixtures DIR]
+                              [--nyaa-latency-ms 50] [--qb-latency-ms 5]
+                              [--searches 50] [--out results.json]
+
+Starts the stub nyaa and stub qBittorrent servers, points the app at them
+with a throwaway database and runs:
+
+  backfill  download_all_episodes_with_progress for the first --backfill shows
+  sweep     check_for_new_episodes over all --shows, twice (new releases, then none)
+  search    GET /search/<id> through the Flask test client, round-robin
+
+The load is synthetic by default: the stub generates --pages listing pages
+of 75 made-up releases per query. --fixtures DIR serves the saved
+page-<n>.html/rss.xml in DIR to every query instead (bench/fixtures holds
+hand-written pages; drop real nyaa pages in a directory of their own to
+measure against recorded listings). Every show then sees the same
+torrents, so only the first backfill adds anything. The output's
+config.load says which was used.
+
+It prints one JSON document (throughput, latency percentiles, nyaa and
+qBittorrent request counts) meant to be diffed between versions. App
+settings such as BACKFILL_CONCURRENCY or NYAA_FETCH_MODE are read from the
+environment as usual and recorded in the output.
+"""
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, '..', 'app'))
+
+import stub_nyaa  # noqa: E402
+import stub_qbittorrent  # noqa: E402
+
+APP_SETTINGS = ('NYAA_FETCH_MODE', 'NYAA_PARSER', 'NYAA_COALESCE', 'BACKFILL_CONCURRENCY',
+                'NYAA_HOST_CONNECTIONS', 'SWEEP_CONCURRENCY', 'HTTP_CACHE_TTL', 'CATALOG_TTL', 'DB_FLUSH_INTERVAL')
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+    return {'p50_ms': pick(0.5), 'p90_ms': pick(0.9), 'p99_ms': pick(0.99), 'max_ms': round(ordered[-1] * 1000, 2)}
+
+
+class Counts:
+    """Request counters of both stubs, as deltas since the last snapshot."""
+
+    def __init__(self, nyaa, qb, commits=lambda: 0):
+        self.nyaa, self.qb, self.commits = nyaa, qb, commits
+        self.last = self._now()
+
+    def _now(self):
+        return {'nyaa_requests': self.nyaa.hits, 'nyaa_not_modified': self.nyaa.not_modified,
+                'qb_logins': self.qb.stats['logins'], 'qb_add_calls': self.qb.stats['add_calls'],
+                'qb_torrents': self.qb.stats['torrents'], 'db_commits': self.commits()}
+
+    def delta(self):
+        now = self._now()
+        diff = {key: now[key] - self.last[key] for key in now}
+        self.last = now
+        return diff
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    if args.fixtures:
+        nyaa = stub_nyaa.start(fixtures_dir=args.fixtures, latency=args.nyaa_latency_ms / 1000)
+    else:
+        nyaa = stub_nyaa.start(latency=args.nyaa_latency_ms / 1000, pages=args.pages)
+    qb = stub_qbittorrent.start(latency=args.qb_latency_ms / 1000)
+    workdir = tempfile.mkdtemp(prefix='anime-bench-')
+    os.environ.update({
+        'NYAA_BASE_URL': f"http://127.0.0.1:{nyaa.server_address[1]}",
+        'QBITTORRENT_HOST': '127.0.0.1',
+        'QBITTORRENT_PORT': str(qb.server_address[1]),
+        'DB_PATH': os.path.join(workdir, 'anime_watchlist.db'),
+        'PROGRESS_SPOOL_DIR': os.path.join(workdir, 'progress'),
+        'METRICS_DIR': os.path.join(workdir, 'metrics'),
+        'UPSTREAM_STATE_PATH': os.path.join(workdir, 'upstream.db'),
+        'SCHEDULER_ENABLED': '0',
+    })
+    os.environ.setdefault('HTTP_CACHE_TTL', '0')  # every fetch reaches the stub (as a 200 or a 304)
+    os.environ.setdefault('NYAA_RATE', '1000')    # measure the app, not the politeness limit
+    os.environ.setdefault('NYAA_BURST', '1000')
+    os.environ.setdefault('QBITTORRENT_RATE', '1000')
+    os.environ.setdefault('QBITTORRENT_BURST', '1000')
+
+    import app as anime_app
+    import db
+    from jobs import enqueue
+
+    anime_app.init_db()
+
+    conn = anime_app.get_db()
+    cursor = conn.cursor()
+    shows = []
+    for i in range(args.shows):
+        cursor.execute(
+            "INSERT INTO anime (title, search_query, last_episode, auto_download) VALUES (?, ?, 0, 1)",
+            (f"Bench Show {i}", f"bench show {i}")
+        )
+        shows.append((cursor.lastrowid, f"bench show {i}"))
+    anime_ids = [anime_id for anime_id, _ in shows]
+    conn.commit()
+
+    counts = Counts(nyaa, qb, commits=lambda: db.SQLITE_SECONDS.values.get('kind="commit"', [0])[-1])
+    results = {
+        'revision': git_revision(),
+        'config': {**vars(args), **{name: getattr(anime_app, name) for name in APP_SETTINGS},
+                   'load': f"fixtures:{args.fixtures}" if args.fixtures else 'synthetic'},
+        'scenarios': {},
+    }
+
+    # backfill -------------------------------------------------------------
+    durations = []
+    started = time.perf_counter()
+    for anime_id, search_query in shows[:args.backfill]:
+        task_id = enqueue(cursor, anime_id, 'download_all', total_pages=args.pages)
+        conn.commit()
+        t0 = time.perf_counter()
+        anime_app.download_all_episodes_with_progress(anime_id, search_query, task_id)
+        durations.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    results['scenarios']['backfill'] = {
+        'runs': len(durations), 'seconds': round(elapsed, 3),
+        'pages_per_second': round(len(durations) * args.pages / elapsed, 2) if elapsed else None,
+        **percentiles(durations), **counts.delta(),
+    }
+
+    # sweep ------------------------------------------------------------------
+    for label in ('sweep_new', 'sweep_idle'):
+        started = time.perf_counter()
+        anime_app.check_for_new_episodes()
+        elapsed = time.perf_counter() - started
+        results['scenarios'][label] = {
+            'shows': len(anime_ids), 'seconds': round(elapsed, 3),
+            'shows_per_second': round(len(anime_ids) / elapsed, 2) if elapsed else None,
+            **counts.delta(),
+        }
+
+    # search -----------------------------------------------------------------
+    client = anime_app.app.test_client()
+    durations, errors = [], 0
+    started = time.perf_counter()
+    for n in range(args.searches):
+        t0 = time.perf_counter()
+        response = client.get(f"/search/{anime_ids[n % len(anime_ids)]}")
+        durations.append(time.perf_counter() - t0)
+        errors += response.status_code != 200
+    elapsed = time.perf_counter() - started
+    results['scenarios']['search'] = {
+        'requests': len(durations), 'errors': errors, 'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(durations) / elapsed, 2) if elapsed else None,
+        **percentiles(durations), **counts.delta(),
+    }
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shows', type=int, default=20, help="watchlist size")
+    parser.add_argument('--backfill', type=int, default=3, help="shows to run a full backfill for")
+    parser.add_argument('--pages', type=int, default=5, help="generated listing pages per search query")
+    parser.add_argument('--fixtures', metavar='DIR', help="serve the saved listings in DIR instead of generated ones")
+    parser.add_argument('--nyaa-latency-ms', type=float, default=50)
+    parser.add_argument('--qb-latency-ms', type=float, default=5)
+    parser.add_argument('--searches', type=int, default=50)
+    parser.add_argument('--out', help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(sys.stderr):  # the app logs with print()
+        results = run(args)
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""Local stand-in for nyaa.si that serves saved fixtures.
+
+    python bench/stub_nyaa.py --port 8900 [--latency-ms 150] [--pages 10]
+    NYAA_BASE_URL=http://127.0.0.1:8900 NYAA_FETCH_MODE=rss python app/app.py
+
+`?page=rss` answers with fixtures/rss.xml, listing pages with
+fixtures/page-<p>.html (an empty listing when the file is missing).
+With --pages N every search query instead gets its own generated
+N-page listing (and feed), so watchlists of any size have distinct
+torrents. Responses carry an ETag and honour If-None-Match with a 304;
+--latency-ms delays every response.
+"""
+import argparse
+import hashlib
+import html
+import os
+import threading
+import time
+from functools import lru_cache
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, quote
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+EMPTY_LISTING = b'<html><body><table class="torrent-list"><tbody></tbody></table></body></html>'
+
+ROWS_PER_PAGE = 75
+GROUPS = ('SubsPlease', 'Erai-raws', 'ASW')
+
+
+# ---- generated listings -----------------------------------------------------
+def synthetic_rows(query, total_pages):
+    """Newest-first rows for query: three releases per episode, ids descending."""
+    rows = []
+    total = total_pages * ROWS_PER_PAGE
+    for i in range(total):
+        torrent_id = 5_000_000 - i
+        episode = (total - i - 1) // len(GROUPS) + 1
+        infohash = hashlib.sha1(f"{query}/{torrent_id}".encode()).hexdigest()
+        title = f"[{GROUPS[i % len(GROUPS)]}] {query.title()} - {episode:02d} (1080p) [{infohash[:8].upper()}].mkv"
+        timestamp = 1_700_000_000 - i * 3600
+        rows.append((torrent_id, title, infohash, timestamp))
+    return rows
+
+
+@lru_cache(maxsize=1024)
+def synthetic_page(query, page, total_pages):
+    rows = synthetic_rows(query, total_pages)[(page - 1) * ROWS_PER_PAGE:page * ROWS_PER_PAGE]
+    out = ['<html><body><table class="table torrent-list"><tbody>']
+    for torrent_id, title, infohash, timestamp in rows:
+        magnet = f"magnet:?xt=urn:btih:{infohash}&dn={quote(title, safe='')}"
+        out.append(
+            '<tr class="default"><td><a href="/?c=1_2">cat</a></td>'
+            f'<td colspan="2"><a href="/view/{torrent_id}" title="{html.escape(title)}">{html.escape(title)}</a></td>'
+            f'<td class="text-center"><a href="/download/{torrent_id}.torrent"></a><a href="{html.escape(magnet)}"></a></td>'
+            '<td class="text-center">1.4 GiB</td>'
+            f'<td class="text-center" data-timestamp="{timestamp}">{time.strftime("%Y-%m-%d %H:%M", time.gmtime(timestamp))}</td>'
+            '<td class="text-center">100</td><td class="text-center">1</td><td class="text-center">1000</td></tr>'
+        )
+    out.append('</tbody></table><ul class="pagination">')
+    out.extend(f'<li><a href="/?p={p}">{p}</a></li>' for p in range(1, total_pages + 1))
+    out.append('</ul></body></html>')
+    return ''.join(out).encode()
+
+
+@lru_cache(maxsize=1024)
+def synthetic_feed(query, total_pages):
+    out = ['<?xml version="1.0" encoding="utf-8"?><rss xmlns:nyaa="https://nyaa.si/xmlns/nyaa" version="2.0"><channel>']
+    for torrent_id, title, infohash, timestamp in synthetic_rows(query, total_pages)[:ROWS_PER_PAGE]:
+        out.append(
+            f'<item><title>{html.escape(title)}</title><guid>https://nyaa.si/view/{torrent_id}</guid>'
+            f'<pubDate>{time.strftime("%a, %d %b %Y %H:%M:%S -0000", time.gmtime(timestamp))}</pubDate>'
+            f'<nyaa:seeders>100</nyaa:seeders><nyaa:infoHash>{infohash}</nyaa:infoHash>'
+            '<nyaa:size>1.4 GiB</nyaa:size></item>'
+        )
+    out.append('</channel></rss>')
+    return ''.join(out).encode()
+
+
+def make_handler(fixtures_dir):
+    class NyaaHandler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send(self, body, content_type):
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()
+            with self.server.lock:
+                self.server.hits += 1
+            if self.headers.get('If-None-Match') == etag:
+                with self.server.lock:
+                    self.server.not_modified += 1
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            query = parse_qs(urlsplit(self.path).query)
+            if self.server.pages:
+                search = query.get('q', [''])[0]
+                if query.get('page') == ['rss']:
+                    return self._send(synthetic_feed(search, self.server.pages), 'application/xml')
+                page = int(query.get('p', ['1'])[0])
+                if 1 <= page <= self.server.pages:
+                    return self._send(synthetic_page(search, page, self.server.pages), 'text/html; charset=utf-8')
+                return self._send(EMPTY_LISTING, 'text/html; charset=utf-8')
+
+            if query.get('page') == ['rss']:
+                name, content_type = 'rss.xml', 'application/xml'
+            else:
+                page = query.get('p', ['1'])[0]
+                name, content_type = f'page-{page}.html', 'text/html; charset=utf-8'
+
+            path = os.path.join(fixtures_dir, name)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    self._send(f.read(), content_type)
+            elif content_type.startswith('text/html'):
+                self._send(EMPTY_LISTING, content_type)
+            else:
+                self.send_error(404)
+
+    return NyaaHandler
+
+
+def make_server(port=0, fixtures_dir=FIXTURES_DIR, latency=0.0, pages=0):
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(fixtures_dir))
+    server.daemon_threads = True
+    server.request_queue_size = 128
+    server.lock = threading.Lock()
+    server.hits = 0
+    server.not_modified = 0
+    server.latency = latency
+    server.pages = pages
+    return server
+
+
+def start(port=0, fixtures_dir=FIXTURES_DIR, latency=0.0, pages=0):
+    """Serve in a daemon thread; returns the server (server.server_address has
+    the port, server.hits / server.not_modified count requests; latency and
+    pages can be changed while it runs)."""
+    server = make_server(port, fixtures_dir, latency, pages)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--fixtures', default=FIXTURES_DIR)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--pages', type=int, default=0, help="generate N-page listings per query instead of fixtures")
+    args = parser.parse_args()
+    server = make_server(args.port, args.fixtures, args.latency_ms / 1000, args.pages)
+    source = f"{args.pages} generated pages per query" if args.pages else args.fixtures
+    print(f"stub nyaa on http://127.0.0.1:{args.port} serving {source}")
+    server.serve_forever()
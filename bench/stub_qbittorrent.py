@@ -0,0 +1,145 @@
+"""Local stand-in for the qBittorrent WebUI API that only counts.
+
+    python bench/stub_qbittorrent.py --port 8880 [--latency-ms 20]
+    QBITTORRENT_HOST=127.0.0.1 QBITTORRENT_PORT=8880 python app/app.py
+
+Accepts any login (SID cookie), then torrents/add and sync/maindata calls
+carrying that cookie; anything else gets 403/404 like the real WebUI.
+server.stats counts logins, add calls, the magnet links received and sync
+calls. Added torrents sit at 0% until update_torrent()/remove_torrent()
+change them; sync/maindata reports those changes by rid like qBittorrent.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs, unquote, urlsplit
+
+_BTIH = re.compile(r'xt=urn:btih:([0-9a-fA-F]{40})')
+_DN = re.compile(r'[?&]dn=([^&]*)')
+
+SID = 'bench-session'
+
+
+class QBittorrentHandler(BaseHTTPRequestHandler):
+    def log_message(self, fmt, *args):
+        pass
+
+    def _reply(self, status, body=b'', headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self):
+        return f'SID={SID}' in (self.headers.get('Cookie') or '')
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if not self._authorized():
+            return self._reply(403, b'Forbidden')
+        if url.path.endswith('/api/v2/sync/maindata'):
+            rid = int(parse_qs(url.query).get('rid', ['0'])[0] or 0)
+            with self.server.lock:
+                self.server.stats['sync_calls'] += 1
+                body = json.dumps(maindata(self.server, rid)).encode()
+            return self._reply(200, body, [('Content-Type', 'application/json')])
+        return self._reply(404)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode())
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        stats = self.server.stats
+
+        if self.path.endswith('/api/v2/auth/login'):
+            with self.server.lock:
+                stats['logins'] += 1
+            return self._reply(200, b'Ok.', [('Set-Cookie', f'SID={SID}; path=/')])
+
+        if not self._authorized():
+            return self._reply(403, b'Forbidden')
+
+        if self.path.endswith('/api/v2/torrents/add'):
+            urls = [u for u in form.get('urls', [''])[0].split('\n') if u]
+            with self.server.lock:
+                stats['add_calls'] += 1
+                stats['torrents'] += len(urls)
+                for magnet in urls:
+                    match = _BTIH.search(magnet)
+                    if match:
+                        name = _DN.search(magnet)
+                        _touch(self.server, match.group(1).lower(), {
+                            'name': unquote(name.group(1)) if name else match.group(1), 'state': 'downloading',
+                            'progress': 0.0, 'size': 1_500_000_000, 'dlspeed': 0, 'eta': 8640000,
+                            'added_on': int(time.time()), 'completion_on': -1,
+                        })
+            return self._reply(200, b'Ok.')
+        return self._reply(404)
+
+
+def _touch(server, infohash, fields):
+    server.rid += 1
+    server.torrents.setdefault(infohash, {}).update(fields)
+    server.changed[infohash] = server.rid
+    server.removed.pop(infohash, None)
+
+
+def maindata(server, rid):
+    """Reply to /sync/maindata?rid=rid; call with server.lock held."""
+    if rid <= 0 or rid > server.rid:
+        return {'rid': server.rid, 'full_update': True, 'torrents': {h: dict(t) for h, t in server.torrents.items()}}
+    return {
+        'rid': server.rid,
+        'torrents': {h: dict(server.torrents[h]) for h, at in server.changed.items() if at > rid},
+        'torrents_removed': [h for h, at in server.removed.items() if at > rid],
+    }
+
+
+def update_torrent(server, infohash, **fields):
+    with server.lock:
+        _touch(server, infohash.lower(), fields)
+
+
+def remove_torrent(server, infohash):
+    with server.lock:
+        infohash = infohash.lower()
+        if server.torrents.pop(infohash, None) is not None:
+            server.rid += 1
+            server.changed.pop(infohash, None)
+            server.removed[infohash] = server.rid
+
+
+def make_server(port=0, latency=0.0):
+    server = ThreadingHTTPServer(('127.0.0.1', port), QBittorrentHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.latency = latency
+    server.stats = {'logins': 0, 'add_calls': 0, 'torrents': 0, 'sync_calls': 0}
+    server.rid = 0
+    server.torrents = {}  # infohash -> maindata fields
+    server.changed = {}   # infohash -> rid of its last change
+    server.removed = {}   # infohash -> rid it was removed at
+    return server
+
+
+def start(port=0, latency=0.0):
+    """Serve in a daemon thread; returns the server (port in server.server_address)."""
+    server = make_server(port, latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8880)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    args = parser.parse_args()
+    server = make_server(args.port, args.latency_ms / 1000)
+    print(f"stub qBittorrent on http://127.0.0.1:{args.port}")
+    server.serve_forever()